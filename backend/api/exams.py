@@ -1,6 +1,6 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, session
 from utils import login_required
-from services import ExamService
+from services import ExamService, GradingService, StatsService
 
 # Create a blueprint for exam routes
 exam_bp = Blueprint('exams', __name__)
@@ -19,6 +19,15 @@ def get_exams():
         'exams': exams_data
     })
 
+@exam_bp.route('/api/exams/stats', methods=['GET'])
+@login_required(role='teacher')
+def get_exam_stats():
+    """Get submission counts and average scores for each of the current teacher's exams"""
+    return jsonify({
+        'success': True,
+        'stats': StatsService.get_teacher_stats(session.get('user_id'))
+    })
+
 @exam_bp.route('/api/create-exam', methods=['POST'])
 @login_required(role='teacher')
 def create_exam():
@@ -45,4 +54,43 @@ def create_exam():
             'exam': result.to_dict()
         })
     else:
-        return jsonify({'success': False, 'message': f'Error creating exam: {result}'}), 500 
\ No newline at end of file
+        return jsonify({'success': False, 'message': f'Error creating exam: {result}'}), 500
+
+@exam_bp.route('/api/exams/<int:exam_id>/grade-all', methods=['POST'])
+@login_required(role='teacher')
+def grade_all(exam_id):
+    """Queue every ungraded or failed submission of an exam for the grading workers"""
+    exam = ExamService.get_teacher_exam(exam_id)
+    if not exam:
+        return jsonify({'success': False, 'message': 'Exam not found'}), 404
+
+    data = request.get_json(silent=True) or {}
+    try:
+        concurrency = int(data.get('concurrency', current_app.config['GRADING_BULK_CONCURRENCY']))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Concurrency must be a number'}), 400
+    concurrency = max(1, min(concurrency, current_app.config['GRADING_BULK_MAX_CONCURRENCY']))
+    bypass_memo = bool(data.get('bypass_memo', False))
+
+    # The grading workers pick the jobs up; at most `concurrency` of them run at once
+    pending = GradingService.enqueue_exam(exam.id, concurrency, bypass_memo=bypass_memo)
+
+    return jsonify({
+        'success': True,
+        'message': f'Queued {pending} submissions for grading',
+        'pending': pending,
+        'concurrency': concurrency
+    })
+
+@exam_bp.route('/api/exams/<int:exam_id>/grading-progress', methods=['GET'])
+@login_required(role='teacher')
+def grading_progress(exam_id):
+    """Get the grading progress of an exam"""
+    exam = ExamService.get_teacher_exam(exam_id)
+    if not exam:
+        return jsonify({'success': False, 'message': 'Exam not found'}), 404
+
+    return jsonify({
+        'success': True,
+        'progress': GradingService.get_exam_progress(exam.id)
+    })
@@ -1,22 +1,33 @@
-from flask import Blueprint, request, jsonify
-from utils import login_required
-from services import SubmissionService, ExamService
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context, send_file, current_app
+from utils import login_required, record_stage, decode_cursor, parse_fields
+from services import SubmissionService, ExamService, GradingService
+from models import Submission
+import json
+import time
 
 # Create a blueprint for submission routes
 submission_bp = Blueprint('submissions', __name__)
 
+# Values of Submission.status accepted by the ?status= listing filter
+SUBMISSION_STATUSES = ('queued', 'grading', 'graded', 'failed')
+
 @submission_bp.route('/api/submit-answer', methods=['POST'])
 @login_required(role='student')
 def submit_answer():
     """Submit an answer for an exam"""
-    if 'answer_sheet' not in request.files:
+    # Accessing request.files parses (and spools) the multipart body
+    parse_start = time.perf_counter()
+    files = request.files
+    exam_code = request.form.get('exam_code')
+    record_stage('request_parsing', time.perf_counter() - parse_start, exam_code)
+
+    if 'answer_sheet' not in files:
         return jsonify({'success': False, 'message': 'No file uploaded!'}), 400
 
-    exam_code = request.form.get('exam_code')
     if not exam_code:
         return jsonify({'success': False, 'message': 'Exam code is required!'}), 400
 
-    answer_sheet = request.files['answer_sheet']
+    answer_sheet = files['answer_sheet']
     if answer_sheet.filename == '':
         return jsonify({'success': False, 'message': 'No file selected!'}), 400
 
@@ -27,39 +38,176 @@ def submit_answer():
         return jsonify({
             'success': True,
             'message': 'Answer submitted successfully!',
-            'submission_id': result.id
+            'submission_id': result.id,
+            'status': result.status
         })
     else:
         return jsonify({'success': False, 'message': f'Error submitting answer: {result}'}), 400
 
+@submission_bp.route('/api/submissions/<int:submission_id>/status', methods=['GET'])
+@login_required()
+def get_submission_status(submission_id):
+    """Get the grading status of a submission"""
+    success, result = GradingService.get_status(submission_id, session.get('user_id'), session.get('role'))
+    
+    if success:
+        return jsonify({
+            'success': True,
+            **result
+        })
+    else:
+        status_code = 404 if result == "Submission not found" else 403
+        return jsonify({'success': False, 'message': result}), status_code
+
+@submission_bp.route('/api/submissions/<int:submission_id>/grade', methods=['GET'])
+@login_required()
+def get_submission_grade(submission_id):
+    """Get the grade body of a submission, which listings leave out by default"""
+    success, result = SubmissionService.get_grade(submission_id, session.get('user_id'), session.get('role'))
+    
+    if success:
+        return jsonify({
+            'success': True,
+            **result
+        })
+    else:
+        status_code = 404 if result == "Submission not found" else 403
+        return jsonify({'success': False, 'message': result}), status_code
+
+@submission_bp.route('/api/submissions/<int:submission_id>/pages/<int:page_number>/preview', methods=['GET'])
+@login_required()
+def get_page_preview(submission_id, page_number):
+    """Get a JPEG preview of one answer sheet page, rendered on demand at ?width="""
+    width = request.args.get('width', current_app.config['PREVIEW_DEFAULT_WIDTH'], type=int)
+    for _ in range(2):
+        success, result = SubmissionService.get_page_preview(
+            submission_id, page_number, width, session.get('user_id'), session.get('role')
+        )
+        if not success:
+            break
+        try:
+            response = send_file(result, mimetype='image/jpeg', conditional=True)
+        except FileNotFoundError:
+            # Another process evicted the preview after the lookup; the next lookup renders it again
+            continue
+        response.headers['Cache-Control'] = f"private, max-age={current_app.config['PREVIEW_MAX_AGE']}"
+        return response
+    else:
+        return jsonify({'success': False, 'message': 'Preview was evicted before it could be sent'}), 503
+    
+    if result == "Submission not found" or result.startswith("Page "):
+        return jsonify({'success': False, 'message': result}), 404
+    elif result == "Unauthorized access":
+        return jsonify({'success': False, 'message': result}), 403
+    else:
+        return jsonify({'success': False, 'message': result}), 502
+
+@submission_bp.route('/api/submissions/<int:submission_id>/grade-stream', methods=['GET'])
+@login_required(role='teacher')
+def stream_grade(submission_id):
+    """Grade a submission, streaming the model's HTML as Server-Sent Events"""
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({'success': False, 'message': 'Submission not found'}), 404
+    if submission.exam.teacher_id != session.get('user_id'):
+        return jsonify({'success': False, 'message': 'Unauthorized access'}), 403
+    
+    def events():
+        for event, data in GradingService.stream_grade(submission):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+        }
+    )
+
+def _listing_args(service):
+    """
+    Parse the paging, filter and fieldset query parameters of a submission listing
+
+    Supports ?limit=, ?cursor= (from the previous page's next_cursor), ?exam_id=,
+    ?published=true|false, ?status= and ?fields= (comma-separated; the grade body
+    is only included when asked for). Without ?limit= or ?cursor= every submission
+    is returned, as before paging existed; a cursor alone pages by
+    SUBMISSIONS_PAGE_SIZE.
+
+    Args:
+        service: ExamService or SubmissionService, whose LISTING_FIELDS are accepted
+
+    Returns:
+        dict: Keyword arguments for the listing service
+
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    config = current_app.config
+    cursor = request.args.get('cursor')
+    args = {'cursor': decode_cursor(cursor) if cursor else None}
+
+    limit = request.args.get('limit')
+    if limit is not None and not limit.isdigit():
+        raise ValueError("limit must be an integer")
+    limit = int(limit) if limit else None
+    if limit is None and cursor:
+        limit = config['SUBMISSIONS_PAGE_SIZE']
+    args['limit'] = None if limit is None else max(1, min(limit, config['SUBMISSIONS_MAX_PAGE_SIZE']))
+
+    exam_id = request.args.get('exam_id')
+    if exam_id is not None and not exam_id.isdigit():
+        raise ValueError("exam_id must be an integer")
+    args['exam_id'] = int(exam_id) if exam_id else None
+
+    published = request.args.get('published')
+    if published not in (None, 'true', 'false'):
+        raise ValueError("published must be 'true' or 'false'")
+    args['published'] = None if published is None else published == 'true'
+
+    status = request.args.get('status')
+    if status is not None and status not in SUBMISSION_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(SUBMISSION_STATUSES)}")
+    args['status'] = status
+
+    args['fields'] = parse_fields(request.args.get('fields'), service.LISTING_FIELDS, service.DEFAULT_LISTING_FIELDS)
+    return args
+
 @submission_bp.route('/api/submissions', methods=['GET'])
 @login_required(role='student')
 def get_student_submissions():
-    """Get all submissions for the current student"""
-    submissions = SubmissionService.get_student_submissions()
+    """Get a page of submissions for the current student, newest first"""
+    try:
+        args = _listing_args(SubmissionService)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    submissions, next_cursor = SubmissionService.get_student_submissions(**args)
     
     return jsonify({
         'success': True,
-        'submissions': submissions
+        'submissions': submissions,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
     })
 
 @submission_bp.route('/api/teacher/submissions', methods=['GET'])
 @login_required(role='teacher')
 def get_teacher_submissions():
-    """Get all submissions for exams created by the current teacher"""
-    from flask import session
-    
-    # Debug authentication
-    print(f"Authenticated request to /api/teacher/submissions")
-    print(f"Session: {dict(session)}")
-    
-    submissions = ExamService.get_teacher_submissions()
+    """Get a page of submissions for exams created by the current teacher, newest first"""
+    try:
+        args = _listing_args(ExamService)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    print(f"Retrieved {len(submissions)} submissions for teacher {session.get('user_id')}")
+    submissions, next_cursor = ExamService.get_teacher_submissions(**args)
     
     return jsonify({
         'success': True,
-        'submissions': submissions
+        'submissions': submissions,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
     })
 
 @submission_bp.route('/api/publish_grade/<int:submission_id>', methods=['POST'])
@@ -96,6 +244,21 @@ def update_grade(submission_id):
     else:
         return jsonify({'success': False, 'message': f'Error updating grade: {result}'}), 400
 
+@submission_bp.route('/api/regrade/<int:submission_id>', methods=['POST'])
+@login_required(role='teacher')
+def regrade(submission_id):
+    """Queue a fresh grade for a submission, ignoring memoized results"""
+    success, result = GradingService.regrade(submission_id, session.get('user_id'))
+    
+    if success:
+        return jsonify({
+            'success': True,
+            'message': 'Regrade queued!',
+            'status': result.status
+        })
+    else:
+        return jsonify({'success': False, 'message': f'Error queueing regrade: {result}'}), 400
+
 @submission_bp.route('/api/test-grading', methods=['POST'])
 def test_grading():
     """Test endpoint for the grading functionality"""
@@ -1,11 +1,18 @@
 import os
-from flask import Flask, send_from_directory, session, jsonify, request
+import time
+import uuid
+import threading
+import click
+from flask import Flask, session, jsonify, request, Response
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 from extensions import db, init_extensions
 from config import config
-from models import User
+from models import User, Exam, Submission
 from api import auth_bp, exam_bp, submission_bp
+from services import (GradingService, GradingWorkerPool, ScoreService, StorageService, StatsService, ExamService,
+                      SubmissionService)
+from utils import gemini_limiter, rubric_cache, render_metrics, serve_upload, explain, full_scans, sorts, count_queries
 from datetime import timedelta
 
 def create_app(config_name='default'):
@@ -64,11 +71,178 @@ def create_app(config_name='default'):
             db.session.commit()
             print("Created test user: username='test', password='test', role='teacher'")
     
+    # Grading workers normally run in `flask grading-worker` processes. With
+    # GRADING_IN_PROCESS they also run inside the web server, starting with its first
+    # request, so CLI commands and the debug reloader's watcher never claim jobs.
+    if app.config['GRADING_IN_PROCESS'] and app.config['GRADING_WORKERS'] > 0:
+        start_lock = threading.Lock()
+        
+        @app.before_request
+        def start_grading_workers():
+            if 'grading_workers' in app.extensions:
+                return
+            with start_lock:
+                if 'grading_workers' not in app.extensions:
+                    pool = GradingWorkerPool(app, app.config['GRADING_WORKERS'], app.config['GRADING_POLL_INTERVAL'])
+                    pool.start()
+                    app.extensions['grading_workers'] = pool
+    
+    @app.cli.command('grading-worker')
+    def grading_worker():
+        """Run grading workers in the foreground until interrupted"""
+        pool = GradingWorkerPool(app, max(app.config['GRADING_WORKERS'], 1), app.config['GRADING_POLL_INTERVAL'])
+        pool.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("Stopping grading workers...")
+            pool.stop()
+    
+    @app.cli.command('grade-exam')
+    @click.argument('exam_id', type=int)
+    @click.option('--concurrency', type=int, default=None, help='Maximum submissions graded at once')
+    @click.option('--bypass-memo', is_flag=True, help='Always call the model instead of reusing memoized grades')
+    @click.option('--wait/--no-wait', default=True, help='Report progress until the queued submissions settle')
+    def grade_exam(exam_id, concurrency, bypass_memo, wait):
+        """Queue every ungraded or failed submission of an exam for the grading workers"""
+        if concurrency is None:
+            concurrency = app.config['GRADING_BULK_CONCURRENCY']
+        concurrency = max(1, min(concurrency, app.config['GRADING_BULK_MAX_CONCURRENCY']))
+        
+        # Same path as the grade-all endpoint: `flask grading-worker` processes do the grading
+        pending = GradingService.enqueue_exam(exam_id, concurrency, bypass_memo=bypass_memo)
+        print(f"Queued {pending} submissions of exam {exam_id} with concurrency {concurrency}")
+        if not wait or not pending:
+            return
+        
+        last = None
+        try:
+            while True:
+                db.session.expire_all()
+                progress = GradingService.get_exam_progress(exam_id)
+                if progress != last:
+                    print(", ".join(f"{key}={value}" for key, value in progress.items()))
+                    last = progress
+                if not progress['queued'] and not progress['grading']:
+                    break
+                time.sleep(app.config['GRADING_POLL_INTERVAL'])
+        except KeyboardInterrupt:
+            print("Stopped waiting; the queued submissions stay queued for the workers")
+            return
+        print(f"Finished grading exam {exam_id}")
+    
+    @app.cli.command('rebuild-scores')
+    @click.option('--exam-id', type=int, default=None, help='Only rebuild the submissions of this exam')
+    def rebuild_scores(exam_id):
+        """Re-parse per-question scores from existing grades"""
+        processed = ScoreService.rebuild_scores(exam_id)
+        print(f"Rebuilt scores for {processed} submissions")
+    
+    @app.cli.command('rebuild-exam-stats')
+    @click.option('--exam-id', type=int, default=None, help='Only rebuild the counters of this exam')
+    def rebuild_exam_stats(exam_id):
+        """Recompute per-exam submission counters, correcting any drift"""
+        changed = StatsService.rebuild(exam_id)
+        print(f"Corrected counters for {changed} exams")
+    
+    @app.cli.command('check-query-plans')
+    @click.option('--teacher-id', type=int, help='Teacher whose listings are explained (default: one with exams)')
+    @click.option('--student-id', type=int, help='Student whose listing is explained (default: one with submissions)')
+    @click.option('--exam-id', type=int, help="Exam for the per-exam listing (default: one of the teacher's)")
+    def check_query_plans(teacher_id, student_id, exam_id):
+        """Fail if a listing query would read the whole submission or exam table, or sort its rows"""
+        # Plans can depend on the ids, so explain with ones that exist
+        if teacher_id is None:
+            teacher_id = db.session.query(Exam.teacher_id).order_by(Exam.id).limit(1).scalar() or 1
+        if student_id is None:
+            student_id = db.session.query(Submission.student_id).order_by(Submission.id).limit(1).scalar() or 1
+        if exam_id is None:
+            exam_id = (db.session.query(Exam.id).filter(Exam.teacher_id == teacher_id)
+                       .order_by(Exam.id).limit(1).scalar()) or 1
+        print(f"Explaining with teacher {teacher_id}, student {student_id}, exam {exam_id}")
+        
+        checks = [
+            ('teacher submissions', ExamService.teacher_submissions_query(teacher_id), 'submission'),
+            ('exam submissions', ExamService.teacher_submissions_query(teacher_id, exam_id=exam_id), 'submission'),
+            ('student submissions', SubmissionService.student_submissions_query(student_id), 'submission'),
+            ('teacher exams', Exam.query.filter_by(teacher_id=teacher_id), 'exam'),
+        ]
+        failures = 0
+        for name, query, table in checks:
+            try:
+                plan = explain(db.session, query)
+            except ValueError as e:
+                raise click.UsageError(str(e))
+            scans = full_scans(plan, table)
+            sorted_rows = sorts(plan)
+            print(f"{name}: {'FULL SCAN' if scans else 'SORT' if sorted_rows else 'ok'}")
+            for line in plan:
+                print(f"    {line}")
+            failures += bool(scans or sorted_rows)
+        if failures:
+            raise SystemExit(1)
+    
+    @app.cli.command('check-query-counts')
+    @click.option('--rows', type=int, default=50, help='Submissions added for the larger measurement')
+    def check_query_counts(rows):
+        """Fail if the submission listings or grade detail take more than one query as submissions grow"""
+        # Sample data lives only inside this transaction and is rolled back at the end
+        teacher = User(username=f'query-check-teacher-{uuid.uuid4().hex[:8]}', role='teacher', password_hash='-')
+        student = User(username=f'query-check-student-{uuid.uuid4().hex[:8]}', role='student', password_hash='-')
+        db.session.add_all([teacher, student])
+        db.session.flush()
+        exam = Exam(title='Query count check', teacher_id=teacher.id, question_paper_file='-', rubric_file='-',
+                    exam_code=uuid.uuid4().hex[:6].upper())
+        db.session.add(exam)
+        db.session.flush()
+        
+        def add_submissions(count):
+            added = [Submission(student_id=student.id, exam_id=exam.id, teacher_id=teacher.id, answer_sheet_file='-')
+                     for _ in range(count)]
+            db.session.add_all(added)
+            db.session.flush()
+            return added
+        
+        first = add_submissions(1)[0]
+        listings = [
+            ('teacher submissions', lambda: ExamService.get_teacher_submissions(teacher.id)),
+            ('student submissions', lambda: SubmissionService.get_student_submissions(student.id)),
+            ('submission grade', lambda: SubmissionService.get_grade(first.id, teacher.id, 'teacher')),
+        ]
+        try:
+            counts = {name: [] for name, _ in listings}
+            for count in (0, rows):
+                add_submissions(count)
+                for name, listing in listings:
+                    with count_queries(db.engine) as counter:
+                        listing()
+                    counts[name].append(counter.count)
+        finally:
+            db.session.rollback()
+        
+        failures = 0
+        for name, (small, large) in counts.items():
+            constant = small == large == 1
+            print(f"{name}: {small} queries for 1 submission, {large} for {rows + 1} "
+                  f"{'ok' if constant else 'NOT CONSTANT'}")
+            failures += not constant
+        if failures:
+            raise SystemExit(1)
+    
+    @app.cli.command('gc-uploads')
+    @click.option('--dry-run', is_flag=True, help='Only report what would be deleted')
+    def gc_uploads(dry_run):
+        """Delete locally stored files no exam or submission references"""
+        result = StorageService.collect_garbage(app.config['BLOB_GC_GRACE_SECONDS'], dry_run=dry_run)
+        print(f"{'Would delete' if dry_run else 'Deleted'} {result['deleted']} files "
+              f"({result['bytes_freed']} bytes), kept {result['kept']}")
+    
     # Route to serve files from the upload folder
     @app.route('/uploads/<path:filename>')
     def serve_file(filename):
-        """Serve uploaded files"""
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        """Serve uploaded files with ETags, byte ranges and long-lived caching"""
+        return serve_upload(filename)
     
     # Debug route for session testing
     @app.route('/api/debug/session')
@@ -84,6 +258,22 @@ def create_app(config_name='default'):
             }
         })
     
+    # Prometheus scrape endpoint
+    @app.route('/metrics')
+    def metrics():
+        """Pipeline stage timings, Gemini limiter and rubric cache state"""
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+    
+    # Debug route for grading pipeline state
+    @app.route('/api/debug/grading')
+    def debug_grading():
+        """Current Gemini limiter state and rubric cache counters"""
+        return jsonify({
+            'limiter': gemini_limiter.stats(),
+            'rubric_cache': rubric_cache.stats()
+        })
+    
     # After request handler to debug session headers
     @app.after_request
     def after_request_func(response):
@@ -92,8 +282,11 @@ def create_app(config_name='default'):
     
     return app
 
-app = create_app(os.getenv('FLASK_CONFIG', 'development'))
+# Render pool workers re-import this script as __mp_main__ under `python app.py`;
+# they only render pages, so they must not build the app (or run db.create_all)
+if __name__ != '__mp_main__':
+    app = create_app(os.getenv('FLASK_CONFIG', 'development'))
+
 # Run the app when this script is executed directly
 if __name__ == '__main__':
-    app = create_app(os.getenv('FLASK_CONFIG', 'development'))
     app.run(debug=(os.getenv('FLASK_ENV', 'development') == 'development')) 
\ No newline at end of file
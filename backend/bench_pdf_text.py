@@ -0,0 +1,91 @@
+"""
+Compare PDF text extraction paths on local files.
+
+Usage:
+    python bench_pdf_text.py answer_sheet.pdf rubric.pdf --repeat 5 --workers 4
+
+For each file it times the old PyPDF2 extractor, sequential PyMuPDF, and the
+cached extractor in utils.pdf_text (first call cold, then warm). The render pool
+is started on a throwaway document first, so "cold" means an empty page cache,
+not process start-up.
+
+Importing utils builds the Gemini client, which needs GOOGLE_API_KEY; a
+placeholder is used when it is not set, since the benchmark makes no model calls.
+"""
+import argparse
+import io
+import os
+import time
+from PyPDF2 import PdfReader
+import fitz  # PyMuPDF
+
+# Set before importing utils; the render pool's workers inherit it too
+os.environ.setdefault('GOOGLE_API_KEY', 'unused-by-benchmark')
+from utils.pdf_text import PdfTextExtractor
+
+def pypdf2_text(content):
+    # The previous extract_pdf_text implementation
+    reader = PdfReader(io.BytesIO(content))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() or ""
+    return text
+
+def pymupdf_text(content):
+    with fitz.open(stream=content, filetype="pdf") as pdf_document:
+        return "".join(page.get_text() for page in pdf_document)
+
+def warm_pool(workers, pages):
+    """Start the render pool's workers by extracting a throwaway document"""
+    with fitz.open() as pdf_document:
+        for number in range(pages):
+            pdf_document.new_page().insert_text((72, 72), f"Warm-up page {number + 1}")
+        content = pdf_document.tobytes()
+    PdfTextExtractor(workers=workers, parallel_min_pages=1).extract(content)
+
+def best_of(repeat, func, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+', help='PDF files to extract')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes for parallel extraction')
+    parser.add_argument('--parallel-min-pages', type=int, default=16, help='Pages before extraction fans out')
+    args = parser.parse_args()
+
+    warm_pool(args.workers, max(args.workers, args.parallel_min_pages))
+
+    for path in args.files:
+        with open(path, 'rb') as f:
+            content = f.read()
+        with fitz.open(stream=content, filetype="pdf") as pdf_document:
+            page_count = pdf_document.page_count
+        print(f"{path}: {page_count} pages, {len(content)} bytes")
+
+        pypdf2_seconds, pypdf2_result = best_of(args.repeat, pypdf2_text, content)
+        pymupdf_seconds, _ = best_of(args.repeat, pymupdf_text, content)
+
+        extractor = PdfTextExtractor(workers=args.workers, parallel_min_pages=args.parallel_min_pages)
+        start = time.perf_counter()
+        extracted = extractor.extract(content)
+        cold_seconds = time.perf_counter() - start
+        warm_seconds, _ = best_of(args.repeat, extractor.extract, content)
+
+        rows = [
+            ('PyPDF2 (old)', pypdf2_seconds, len(pypdf2_result)),
+            ('PyMuPDF sequential', pymupdf_seconds, len(extracted)),
+            ('extractor cold', cold_seconds, len(extracted)),
+            ('extractor warm', warm_seconds, len(extracted)),
+        ]
+        for name, seconds, chars in rows:
+            speedup = pypdf2_seconds / seconds if seconds else float('inf')
+            print(f"  {name:<20} {seconds * 1000:9.1f} ms  {chars:8d} chars  {speedup:7.1f}x")
+
+if __name__ == '__main__':
+    main()
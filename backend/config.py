@@ -1,11 +1,21 @@
 import os
+from dotenv import load_dotenv
 from datetime import timedelta
 
+# Load .env before the settings below read the environment
+load_dotenv()
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///ai_grader.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = 'uploads'
+    BLOB_STORE_FOLDER = 'blobs'  # Content-addressed local uploads, inside UPLOAD_FOLDER
+    UPLOADS_MAX_AGE = int(os.environ.get('UPLOADS_MAX_AGE', 3600))  # Cache lifetime of legacy uuid-named uploads
+    UPLOADS_IMMUTABLE_MAX_AGE = int(os.environ.get('UPLOADS_IMMUTABLE_MAX_AGE', 31536000))  # Content-addressed uploads
+    UPLOADS_ACCEL_REDIRECT_PREFIX = os.environ.get('UPLOADS_ACCEL_REDIRECT_PREFIX')  # nginx internal location for blobs
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'  # Apache/lighttpd X-Sendfile
+    BLOB_GC_GRACE_SECONDS = int(os.environ.get('BLOB_GC_GRACE_SECONDS', 3600))  # Keep unreferenced blobs this long
     
     # Session cookie settings
     SESSION_COOKIE_SECURE = True  # Set to True in production with HTTPS
@@ -17,7 +27,10 @@ class Config:
     
     # File upload configuration
     ALLOWED_EXTENSIONS = {'pdf'}
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
+    # Uploads are streamed to disk in chunks, so the limit no longer bounds worker memory
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 200 * 1024 * 1024))  # 200MB max upload
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # Bytes copied per read
+    CLOUDINARY_CHUNK_SIZE = int(os.environ.get('CLOUDINARY_CHUNK_SIZE', 20 * 1024 * 1024))  # Min 5MB
     
     # CORS settings
     CORS_ORIGINS = [
@@ -31,6 +44,18 @@ class Config:
     CORS_HEADERS = ['Content-Type', 'Authorization', 'Access-Control-Allow-Credentials', 'Access-Control-Allow-Origin']
     CORS_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']
     
+    # Storage backend: 'cloudinary' (falls back to local), 'local' or 's3'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'cloudinary')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX', 'blobs/')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_ACCESS_KEY_ID = os.environ.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY')
+    S3_MULTIPART_THRESHOLD = int(os.environ.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+    S3_MULTIPART_CHUNK_SIZE = int(os.environ.get('S3_MULTIPART_CHUNK_SIZE', 8 * 1024 * 1024))
+    S3_MAX_CONCURRENCY = int(os.environ.get('S3_MAX_CONCURRENCY', 8))  # Parallel multipart parts
+    
     # Cloudinary settings
     CLOUDINARY_CLOUD_NAME = os.environ.get("CLOUDINARY_CLOUD_NAME")
     CLOUDINARY_API_KEY = os.environ.get("CLOUDINARY_API_KEY")
@@ -39,12 +64,88 @@ class Config:
     # AI services
     GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
     
+    # Background grading queue
+    GRADING_WORKERS = int(os.environ.get('GRADING_WORKERS', 2))  # Worker threads per process, 0 disables
+    # Also run workers inside the web server (single-process deployments); otherwise run `flask grading-worker`
+    GRADING_IN_PROCESS = os.environ.get('GRADING_IN_PROCESS', 'false').lower() == 'true'
+    GRADING_POLL_INTERVAL = float(os.environ.get('GRADING_POLL_INTERVAL', 1.0))  # Seconds between idle polls
+    GRADING_MAX_ATTEMPTS = int(os.environ.get('GRADING_MAX_ATTEMPTS', 3))
+    GRADING_JOB_TIMEOUT = int(os.environ.get('GRADING_JOB_TIMEOUT', 600))  # Seconds before a running job is re-claimed
+    GRADING_PARTIAL_FLUSH_SECONDS = float(os.environ.get('GRADING_PARTIAL_FLUSH_SECONDS', 0.5))  # Live grade publishing
+    GRADING_BULK_CONCURRENCY = int(os.environ.get('GRADING_BULK_CONCURRENCY', 4))  # Default for "grade whole exam"
+    GRADING_BULK_MAX_CONCURRENCY = int(os.environ.get('GRADING_BULK_MAX_CONCURRENCY', 16))
+    
+    # Outbound HTTP (rubric and answer sheet downloads)
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 60))
+    HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', 20))
+    # External URLs only; files stored by this app were already held to MAX_CONTENT_LENGTH
+    DOWNLOAD_MAX_BYTES = int(os.environ.get('DOWNLOAD_MAX_BYTES', MAX_CONTENT_LENGTH))
+    
+    # Gemini rate limiting and retries (process-wide)
+    GEMINI_REQUESTS_PER_MINUTE = int(os.environ.get('GEMINI_REQUESTS_PER_MINUTE', 1000))
+    GEMINI_TOKENS_PER_MINUTE = int(os.environ.get('GEMINI_TOKENS_PER_MINUTE', 4000000))
+    GEMINI_MIN_CONCURRENCY = int(os.environ.get('GEMINI_MIN_CONCURRENCY', 1))
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', 16))
+    GEMINI_MAX_RETRIES = int(os.environ.get('GEMINI_MAX_RETRIES', 5))
+    GEMINI_RETRY_BASE_DELAY = float(os.environ.get('GEMINI_RETRY_BASE_DELAY', 1.0))  # Seconds
+    GEMINI_RETRY_MAX_DELAY = float(os.environ.get('GEMINI_RETRY_MAX_DELAY', 30.0))  # Seconds
+    GRADING_TOKEN_ESTIMATE = int(os.environ.get('GRADING_TOKEN_ESTIMATE', 10000))  # Reserved per call until usage is known
+    
+    # PDF page rendering
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', os.cpu_count() or 1))  # Processes in the render pool
+    PDF_RENDER_DPI = int(os.environ.get('PDF_RENDER_DPI', 300))
+    PDF_IMAGE_ENCODING = os.environ.get('PDF_IMAGE_ENCODING', 'pil')  # 'pil' or 'direct' (JPEG straight from the pixmap)
+    PDF_RENDER_GRAYSCALE = os.environ.get('PDF_RENDER_GRAYSCALE', 'false').lower() == 'true'  # Scanned handwriting
+    PDF_JPEG_QUALITY = int(os.environ.get('PDF_JPEG_QUALITY', 95))
+    PDF_PAGE_BYTE_BUDGET = int(os.environ.get('PDF_PAGE_BYTE_BUDGET', 0)) or None  # Bytes per page image (direct mode)
+    PDF_MIN_DPI = int(os.environ.get('PDF_MIN_DPI', 100))  # Lowest resolution used to meet the byte budget
+    PDF_ENCODE_WORKERS = int(os.environ.get('PDF_ENCODE_WORKERS', 2))  # Threads encoding JPEGs
+    PDF_UPLOAD_WORKERS = int(os.environ.get('PDF_UPLOAD_WORKERS', 4))  # Threads uploading pages
+    PDF_PIPELINE_QUEUE_SIZE = int(os.environ.get('PDF_PIPELINE_QUEUE_SIZE', 4))  # Pages buffered between stages
+    PDF_TEXT_CACHE_CHARS = int(os.environ.get('PDF_TEXT_CACHE_CHARS', 32 * 1024 * 1024))  # Cached page text
+    PDF_TEXT_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_TEXT_PARALLEL_MIN_PAGES', 16))  # Pages before extraction fans out
+    PDF_MAX_PAGES = int(os.environ.get('PDF_MAX_PAGES', 100))  # Per document
+    
+    # PDF preflight before model calls
+    PDF_PREFLIGHT_ENABLED = os.environ.get('PDF_PREFLIGHT_ENABLED', 'true').lower() == 'true'
+    PDF_PREFLIGHT_TARGET_BYTES = int(os.environ.get('PDF_PREFLIGHT_TARGET_BYTES', 8 * 1024 * 1024))  # Larger PDFs are shrunk
+    PDF_PREFLIGHT_IMAGE_DPI = int(os.environ.get('PDF_PREFLIGHT_IMAGE_DPI', 150))  # Embedded images downsampled to this
+    PDF_PREFLIGHT_MIN_IMAGE_DPI = int(os.environ.get('PDF_PREFLIGHT_MIN_IMAGE_DPI', 96))
+    PDF_PREFLIGHT_JPEG_QUALITY = int(os.environ.get('PDF_PREFLIGHT_JPEG_QUALITY', 75))
+    PDF_PREFLIGHT_CACHE_DIR = os.environ.get('PDF_PREFLIGHT_CACHE_DIR', 'cache/preflight')
+    
+    # Answer sheet page previews
+    PREVIEW_CACHE_DIR = os.environ.get('PREVIEW_CACHE_DIR', 'cache/previews')
+    PREVIEW_CACHE_MAX_BYTES = int(os.environ.get('PREVIEW_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # LRU eviction above this
+    PREVIEW_DEFAULT_WIDTH = int(os.environ.get('PREVIEW_DEFAULT_WIDTH', 800))
+    PREVIEW_MAX_WIDTH = int(os.environ.get('PREVIEW_MAX_WIDTH', 1600))
+    PREVIEW_WIDTH_STEP = int(os.environ.get('PREVIEW_WIDTH_STEP', 100))  # Requested widths are rounded up to this
+    PREVIEW_JPEG_QUALITY = int(os.environ.get('PREVIEW_JPEG_QUALITY', 80))
+    PREVIEW_MAX_AGE = int(os.environ.get('PREVIEW_MAX_AGE', 86400))  # Browser cache lifetime
+    
+    # Submission listings (keyset pagination)
+    SUBMISSIONS_PAGE_SIZE = int(os.environ.get('SUBMISSIONS_PAGE_SIZE', 50))  # When ?cursor= comes without ?limit=
+    SUBMISSIONS_MAX_PAGE_SIZE = int(os.environ.get('SUBMISSIONS_MAX_PAGE_SIZE', 200))  # Larger ?limit= values are clamped
+    
+    # Rubric cache (in-memory LRU backed by an on-disk store)
+    RUBRIC_CACHE_DIR = os.environ.get('RUBRIC_CACHE_DIR', 'cache/rubrics')
+    RUBRIC_CACHE_MEMORY_BYTES = int(os.environ.get('RUBRIC_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+    RUBRIC_CACHE_TTL = int(os.environ.get('RUBRIC_CACHE_TTL', 300))  # Seconds before an entry is revalidated
+    RUBRIC_UPLOAD_BACKOFF = int(os.environ.get('RUBRIC_UPLOAD_BACKOFF', 600))  # Seconds before a failed upload is retried
+    
+    # Grade memo (reuses grades for byte-identical answer sheets and rubrics)
+    GRADE_MEMO_ENABLED = os.environ.get('GRADE_MEMO_ENABLED', 'true').lower() == 'true'
+    GRADE_MEMO_TTL = int(os.environ.get('GRADE_MEMO_TTL', 30 * 24 * 3600))  # Seconds
+    GRADE_MEMO_MAX_ENTRIES = int(os.environ.get('GRADE_MEMO_MAX_ENTRIES', 50000))
+    
     # Stripe
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    GRADING_IN_PROCESS = os.environ.get('GRADING_IN_PROCESS', 'true').lower() == 'true'
     SESSION_COOKIE_SECURE = False  # Allow non-HTTPS in development
     SESSION_COOKIE_SAMESITE = 'Lax'  # Less strict SameSite policy for development
     SESSION_COOKIE_DOMAIN = None  # Auto-determine domain
@@ -66,6 +167,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    GRADING_WORKERS = 0
 
 config = {
     'development': DevelopmentConfig,
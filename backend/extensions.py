@@ -7,6 +7,14 @@ import cloudinary.uploader
 import cloudinary.api
 from google import genai
 import stripe
+from utils.http_client import http_client
+from utils.rubric_cache import rubric_cache
+from utils.rate_limiter import gemini_limiter
+from utils.storage import storage
+from utils.pdf_text import pdf_text
+from utils.pdf_preflight import pdf_preflight
+from utils.page_previews import page_previews
+from utils.ai_utils import rubric_handles
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -27,7 +35,7 @@ def init_extensions(app):
          supports_credentials=True,
          allow_headers=app.config['CORS_HEADERS'],
          methods=app.config['CORS_METHODS'],
-         expose_headers=['Set-Cookie', 'Content-Type', 'Authorization'],
+         expose_headers=['Set-Cookie', 'Content-Type', 'Authorization', 'Content-Range', 'Accept-Ranges', 'ETag'],
          allow_credentials=True)
     
     # Configure Cloudinary
@@ -56,5 +64,17 @@ def init_extensions(app):
     else:
         app.logger.warning("GOOGLE_API_KEY not set - AI grading functionality will be limited")
     
+    # Configure the shared download client and rubric cache used by the grading workers
+    http_client.init_app(app)
+    rubric_cache.init_app(app)
+    gemini_limiter.init_app(app)
+    rubric_handles.init_app(app)
+    pdf_text.init_app(app)
+    pdf_preflight.init_app(app)
+    page_previews.init_app(app)
+    
+    # Select the storage backend used for uploads, serving and grading reads
+    storage.init_app(app)
+    
     # Initialize Stripe
     stripe.api_key = app.config['STRIPE_SECRET_KEY'] 
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""Add submission grading status and the grading job queue
+
+Revision ID: 3f2a9c1d7e01
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'status' not in {column['name'] for column in inspector.get_columns('submission')}:
+        op.add_column('submission', sa.Column('status', sa.String(length=20)))
+
+    if 'grading_job' not in inspector.get_table_names():
+        op.create_table(
+            'grading_job',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('submission_id', sa.Integer(), sa.ForeignKey('submission.id'), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('last_error', sa.Text()),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('started_at', sa.DateTime()),
+            sa.Column('finished_at', sa.DateTime()),
+        )
+        op.create_index('ix_grading_job_submission_id', 'grading_job', ['submission_id'])
+        op.create_index('ix_grading_job_status', 'grading_job', ['status'])
+
+    # Submissions from before the grading queue. Failed gradings stored their error
+    # message as the grade, so only other grades count as graded.
+    op.execute(
+        "UPDATE submission SET status = 'failed' "
+        "WHERE status IS NULL AND (grade LIKE '<p>Grading failed%' OR grade LIKE '<p>Error%')"
+    )
+    op.execute("UPDATE submission SET status = 'graded' WHERE status IS NULL AND grade IS NOT NULL")
+
+    # Ungraded ones are queued, with a job so the workers actually grade them
+    op.execute(
+        "INSERT INTO grading_job (submission_id, status, attempts, created_at) "
+        "SELECT id, 'queued', 0, CURRENT_TIMESTAMP FROM submission WHERE status IS NULL"
+    )
+    op.execute("UPDATE submission SET status = 'queued' WHERE status IS NULL")
+
+
+def downgrade():
+    op.drop_table('grading_job')
+    with op.batch_alter_table('submission') as batch_op:
+        batch_op.drop_column('status')
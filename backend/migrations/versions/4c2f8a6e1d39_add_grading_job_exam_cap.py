@@ -0,0 +1,46 @@
+"""Add the exam and per-exam concurrency cap to grading jobs
+
+Revision ID: 4c2f8a6e1d39
+Revises: c7d93e4a1f02
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c2f8a6e1d39'
+down_revision = 'c7d93e4a1f02'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = [
+    sa.Column('exam_id', sa.Integer()),
+    sa.Column('concurrency_limit', sa.Integer()),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {column['name'] for column in inspector.get_columns('grading_job')}
+    for column in NEW_COLUMNS:
+        if column.name not in existing:
+            op.add_column('grading_job', column)
+
+    if 'ix_grading_job_exam_id' not in {index['name'] for index in inspector.get_indexes('grading_job')}:
+        op.create_index('ix_grading_job_exam_id', 'grading_job', ['exam_id'])
+
+    op.execute(
+        "UPDATE grading_job SET exam_id = "
+        "(SELECT submission.exam_id FROM submission WHERE submission.id = grading_job.submission_id) "
+        "WHERE exam_id IS NULL"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_grading_job_exam_id', table_name='grading_job')
+    with op.batch_alter_table('grading_job') as batch_op:
+        for column in reversed(NEW_COLUMNS):
+            batch_op.drop_column(column.name)
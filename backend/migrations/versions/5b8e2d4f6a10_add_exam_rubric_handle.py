@@ -0,0 +1,34 @@
+"""Add the uploaded rubric handle to exams
+
+Revision ID: 5b8e2d4f6a10
+Revises: 3f2a9c1d7e01
+Create Date: 2026-10-18 09:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2d4f6a10'
+down_revision = '3f2a9c1d7e01'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = [
+    sa.Column('rubric_handle_uri', sa.String(length=500)),
+    sa.Column('rubric_handle_expires_at', sa.DateTime()),
+]
+
+
+def upgrade():
+    existing = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('exam')}
+    for column in NEW_COLUMNS:
+        if column.name not in existing:
+            op.add_column('exam', column)
+
+
+def downgrade():
+    with op.batch_alter_table('exam') as batch_op:
+        for column in reversed(NEW_COLUMNS):
+            batch_op.drop_column(column.name)
@@ -0,0 +1,48 @@
+"""Add the grade memo table and the regrade flag on grading jobs
+
+Revision ID: 6d1f3a9b2c47
+Revises: 5b8e2d4f6a10
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1f3a9b2c47'
+down_revision = '5b8e2d4f6a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'bypass_memo' not in {column['name'] for column in inspector.get_columns('grading_job')}:
+        op.add_column('grading_job', sa.Column('bypass_memo', sa.Boolean(), nullable=False,
+                                               server_default=sa.false()))
+
+    if 'grade_memo' not in inspector.get_table_names():
+        op.create_table(
+            'grade_memo',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('answer_sha256', sa.String(length=64), nullable=False),
+            sa.Column('rubric_sha256', sa.String(length=64), nullable=False),
+            sa.Column('prompt_version', sa.String(length=20), nullable=False),
+            sa.Column('model', sa.String(length=50), nullable=False),
+            sa.Column('grade', sa.Text(), nullable=False),
+            sa.Column('hits', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('last_used_at', sa.DateTime()),
+            sa.UniqueConstraint('answer_sha256', 'rubric_sha256', 'prompt_version', 'model',
+                                name='uq_grade_memo_key'),
+        )
+        op.create_index('ix_grade_memo_created_at', 'grade_memo', ['created_at'])
+        op.create_index('ix_grade_memo_last_used_at', 'grade_memo', ['last_used_at'])
+
+
+def downgrade():
+    op.drop_table('grade_memo')
+    with op.batch_alter_table('grading_job') as batch_op:
+        batch_op.drop_column('bypass_memo')
@@ -0,0 +1,37 @@
+"""Add indexes for the submission and exam listing queries
+
+Revision ID: 8b41d6e2c5a3
+Revises: e2b6d8f4a193
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41d6e2c5a3'
+down_revision = 'e2b6d8f4a193'
+branch_labels = None
+depends_on = None
+
+# Newest-first listings filter on the first column and read the rest in index order
+INDEXES = [
+    ('ix_submission_student_submitted', 'submission',
+     ['student_id', sa.text('submitted_at DESC'), sa.text('id DESC')]),
+    ('ix_submission_exam_submitted', 'submission',
+     ['exam_id', sa.text('submitted_at DESC'), sa.text('id DESC')]),
+    ('ix_exam_teacher_id', 'exam', ['teacher_id']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
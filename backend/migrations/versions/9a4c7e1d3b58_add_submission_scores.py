@@ -0,0 +1,53 @@
+"""Add per-question scores and cached score totals on submissions
+
+Revision ID: 9a4c7e1d3b58
+Revises: 6d1f3a9b2c47
+Create Date: 2026-10-18 09:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c7e1d3b58'
+down_revision = '6d1f3a9b2c47'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = [
+    sa.Column('total_awarded', sa.Float()),
+    sa.Column('total_max', sa.Float()),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {column['name'] for column in inspector.get_columns('submission')}
+    for column in NEW_COLUMNS:
+        if column.name not in existing:
+            op.add_column('submission', column)
+
+    if 'ix_submission_exam_total' not in {index['name'] for index in inspector.get_indexes('submission')}:
+        op.create_index('ix_submission_exam_total', 'submission', ['exam_id', 'total_awarded'])
+
+    if 'submission_score' not in inspector.get_table_names():
+        op.create_table(
+            'submission_score',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('submission_id', sa.Integer(), sa.ForeignKey('submission.id'), nullable=False),
+            sa.Column('section', sa.String(length=100)),
+            sa.Column('question', sa.String(length=50), nullable=False),
+            sa.Column('awarded', sa.Float(), nullable=False),
+            sa.Column('max_marks', sa.Float(), nullable=False),
+        )
+        op.create_index('ix_submission_score_submission_id', 'submission_score', ['submission_id'])
+
+
+def downgrade():
+    op.drop_table('submission_score')
+    op.drop_index('ix_submission_exam_total', table_name='submission')
+    with op.batch_alter_table('submission') as batch_op:
+        for column in reversed(NEW_COLUMNS):
+            batch_op.drop_column(column.name)
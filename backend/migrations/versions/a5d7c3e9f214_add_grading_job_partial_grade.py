@@ -0,0 +1,27 @@
+"""Add the partial grade relayed to live viewers of a grading job
+
+Revision ID: a5d7c3e9f214
+Revises: 4c2f8a6e1d39
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d7c3e9f214'
+down_revision = '4c2f8a6e1d39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'partial_grade' not in {column['name'] for column in inspector.get_columns('grading_job')}:
+        op.add_column('grading_job', sa.Column('partial_grade', sa.Text()))
+
+
+def downgrade():
+    with op.batch_alter_table('grading_job') as batch_op:
+        batch_op.drop_column('partial_grade')
@@ -0,0 +1,40 @@
+"""Copy the exam's teacher onto submissions for the teacher listing
+
+Revision ID: b9e1f5c2d8a6
+Revises: a5d7c3e9f214
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9e1f5c2d8a6'
+down_revision = 'a5d7c3e9f214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if 'teacher_id' not in {column['name'] for column in inspector.get_columns('submission')}:
+        op.add_column('submission', sa.Column('teacher_id', sa.Integer()))
+
+    op.execute(
+        "UPDATE submission SET teacher_id = "
+        "(SELECT exam.teacher_id FROM exam WHERE exam.id = submission.exam_id) "
+        "WHERE teacher_id IS NULL"
+    )
+
+    # Newest-first teacher listing reads one range of this index, across all exams
+    if 'ix_submission_teacher_submitted' not in {index['name'] for index in inspector.get_indexes('submission')}:
+        op.create_index('ix_submission_teacher_submitted', 'submission',
+                        ['teacher_id', sa.text('submitted_at DESC'), sa.text('id DESC')])
+
+
+def downgrade():
+    op.drop_index('ix_submission_teacher_submitted', table_name='submission')
+    with op.batch_alter_table('submission') as batch_op:
+        batch_op.drop_column('teacher_id')
@@ -0,0 +1,60 @@
+"""Add the per-exam statistics table and fill it from existing submissions
+
+Revision ID: c7d93e4a1f02
+Revises: 8b41d6e2c5a3
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d93e4a1f02'
+down_revision = '8b41d6e2c5a3'
+branch_labels = None
+depends_on = None
+
+# Exams without a row yet get one computed from their submissions; the
+# rebuild-exam-stats command runs the same computation later to correct drift.
+BACKFILL = """
+INSERT INTO exam_stats (exam_id, submitted, graded, failed, published, scored, awarded_sum, max_sum, updated_at)
+SELECT e.id,
+       COUNT(s.id),
+       COALESCE(SUM(CASE WHEN s.status = 'graded' THEN 1 ELSE 0 END), 0),
+       COALESCE(SUM(CASE WHEN s.status = 'failed' THEN 1 ELSE 0 END), 0),
+       COALESCE(SUM(CASE WHEN s.is_published THEN 1 ELSE 0 END), 0),
+       COALESCE(SUM(CASE WHEN s.total_awarded IS NOT NULL AND s.total_max IS NOT NULL THEN 1 ELSE 0 END), 0),
+       COALESCE(SUM(CASE WHEN s.total_awarded IS NOT NULL AND s.total_max IS NOT NULL
+                         THEN s.total_awarded ELSE 0 END), 0),
+       COALESCE(SUM(CASE WHEN s.total_awarded IS NOT NULL AND s.total_max IS NOT NULL
+                         THEN s.total_max ELSE 0 END), 0),
+       CURRENT_TIMESTAMP
+FROM exam e
+LEFT JOIN submission s ON s.exam_id = e.id
+WHERE e.id NOT IN (SELECT exam_id FROM exam_stats)
+GROUP BY e.id
+"""
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'exam_stats' not in inspector.get_table_names():
+        op.create_table(
+            'exam_stats',
+            sa.Column('exam_id', sa.Integer(), sa.ForeignKey('exam.id'), primary_key=True),
+            sa.Column('submitted', sa.Integer(), nullable=False),
+            sa.Column('graded', sa.Integer(), nullable=False),
+            sa.Column('failed', sa.Integer(), nullable=False),
+            sa.Column('published', sa.Integer(), nullable=False),
+            sa.Column('scored', sa.Integer(), nullable=False),
+            sa.Column('awarded_sum', sa.Float(), nullable=False),
+            sa.Column('max_sum', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime()),
+        )
+
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_table('exam_stats')
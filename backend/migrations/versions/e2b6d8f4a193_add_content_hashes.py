@@ -0,0 +1,39 @@
+"""Add content hashes of stored files to exams and submissions
+
+Revision ID: e2b6d8f4a193
+Revises: 9a4c7e1d3b58
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6d8f4a193'
+down_revision = '9a4c7e1d3b58'
+branch_labels = None
+depends_on = None
+
+# (table, column); each column gets an ix_<table>_<column> index for reference counting
+NEW_COLUMNS = [
+    ('exam', 'question_paper_sha256'),
+    ('exam', 'rubric_sha256'),
+    ('submission', 'answer_sheet_sha256'),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, name in NEW_COLUMNS:
+        if name not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column(name, sa.String(length=64)))
+        if f"ix_{table}_{name}" not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(f"ix_{table}_{name}", table, [name])
+
+
+def downgrade():
+    for table, name in reversed(NEW_COLUMNS):
+        op.drop_index(f"ix_{table}_{name}", table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column(name)
@@ -2,6 +2,10 @@ from models.user import User
 from models.exam import Exam
 from models.submission import Submission
 from models.subscription import Subscription
+from models.grading_job import GradingJob
+from models.grade_memo import GradeMemo
+from models.submission_score import SubmissionScore
+from models.exam_stats import ExamStats
 
 # This makes it possible to import models directly from models package
 # Example: from models import User, Exam
@@ -1,5 +1,6 @@
 from extensions import db
 from datetime import datetime
+from utils.rubric_handles import RubricHandle
 
 class Exam(db.Model):
     """
@@ -7,15 +8,36 @@ class Exam(db.Model):
     """
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     question_paper_file = db.Column(db.String(500), nullable=False)
     rubric_file = db.Column(db.String(500), nullable=False)
+    # Content hashes of the stored files; they are the references counted by StorageService
+    question_paper_sha256 = db.Column(db.String(64), index=True)
+    rubric_sha256 = db.Column(db.String(64), index=True)
     exam_code = db.Column(db.String(6), unique=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Rubric uploaded to the model provider once per exam, reused by every grading call
+    rubric_handle_uri = db.Column(db.String(500))
+    rubric_handle_expires_at = db.Column(db.DateTime)
+    
     # Relationships defined in user.py and submission.py
     submissions = db.relationship('Submission', backref='exam', lazy=True)
     
+    @property
+    def rubric_handle(self):
+        """
+        Get the uploaded rubric handle for this exam
+        """
+        if not self.rubric_handle_uri:
+            return None
+        return RubricHandle(self.rubric_handle_uri, self.rubric_handle_expires_at)
+    
+    @rubric_handle.setter
+    def rubric_handle(self, handle):
+        self.rubric_handle_uri = handle.uri if handle else None
+        self.rubric_handle_expires_at = handle.expires_at if handle else None
+    
     def to_dict(self):
         """
         Convert exam object to dictionary for API responses
@@ -0,0 +1,36 @@
+from extensions import db
+from datetime import datetime
+
+class ExamStats(db.Model):
+    """
+    Submission counters for one exam, maintained incrementally by StatsService
+    """
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    submitted = db.Column(db.Integer, nullable=False, default=0)
+    graded = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    published = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Sums over submissions with parsed totals, for the average score
+    scored = db.Column(db.Integer, nullable=False, default=0)
+    awarded_sum = db.Column(db.Float, nullable=False, default=0.0)
+    max_sum = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    exam = db.relationship('Exam', backref=db.backref('stats', uselist=False, lazy=True))
+    
+    def to_dict(self):
+        """
+        Convert stats object to dictionary for API responses
+        """
+        return {
+            'exam_id': self.exam_id,
+            'submitted': self.submitted,
+            'graded': self.graded,
+            'failed': self.failed,
+            'pending': self.submitted - self.graded - self.failed,
+            'published': self.published,
+            'average_score': self.awarded_sum / self.scored if self.scored else None,
+            'average_percent': 100 * self.awarded_sum / self.max_sum if self.max_sum else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
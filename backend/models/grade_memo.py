@@ -0,0 +1,21 @@
+from extensions import db
+from datetime import datetime
+
+class GradeMemo(db.Model):
+    """
+    Memoized grade keyed by the exact answer sheet, rubric, prompt and model
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    answer_sha256 = db.Column(db.String(64), nullable=False)
+    rubric_sha256 = db.Column(db.String(64), nullable=False)
+    prompt_version = db.Column(db.String(20), nullable=False)
+    model = db.Column(db.String(50), nullable=False)
+    grade = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('answer_sha256', 'rubric_sha256', 'prompt_version', 'model',
+                            name='uq_grade_memo_key'),
+    )
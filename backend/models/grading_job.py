@@ -0,0 +1,39 @@
+from extensions import db
+from datetime import datetime
+
+class GradingJob(db.Model):
+    """
+    Durable grading job picked up by the background grading workers
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, index=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), index=True)  # Copied from the submission for the cap below
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    bypass_memo = db.Column(db.Boolean, nullable=False, default=False)  # Deliberate regrade, always call the model
+    concurrency_limit = db.Column(db.Integer)  # Most jobs of this exam running at once (bulk grading), None for no cap
+    last_error = db.Column(db.Text)
+    partial_grade = db.Column(db.Text)  # Grade streamed so far by the running attempt, relayed to live viewers
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    submission = db.relationship('Submission', backref=db.backref('grading_jobs', lazy=True))
+    
+    def to_dict(self):
+        """
+        Convert grading job object to dictionary for API responses
+        """
+        return {
+            'id': self.id,
+            'submission_id': self.submission_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'exam_id': self.exam_id,
+            'bypass_memo': self.bypass_memo,
+            'concurrency_limit': self.concurrency_limit,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
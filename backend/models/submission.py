@@ -8,11 +8,26 @@ class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # Copy of exam.teacher_id for teacher listings
     answer_sheet_file = db.Column(db.String(500), nullable=False)
+    answer_sheet_sha256 = db.Column(db.String(64), index=True)  # Counted as a reference by StorageService
     grade = db.Column(db.Text)
     is_published = db.Column(db.Boolean, default=False)
+    status = db.Column(db.String(20), default='queued')  # 'queued', 'grading', 'graded', 'failed'
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Totals of the parsed per-question scores, kept in sync with `grade`
+    total_awarded = db.Column(db.Float)
+    total_max = db.Column(db.Float)
+    
+    __table_args__ = (
+        db.Index('ix_submission_exam_total', 'exam_id', 'total_awarded'),
+        # Newest-first listings per student, per teacher and per exam (see migrations/versions)
+        db.Index('ix_submission_student_submitted', student_id, submitted_at.desc(), id.desc()),
+        db.Index('ix_submission_teacher_submitted', teacher_id, submitted_at.desc(), id.desc()),
+        db.Index('ix_submission_exam_submitted', exam_id, submitted_at.desc(), id.desc()),
+    )
+    
     # Relationships defined in user.py and exam.py
     
     def to_dict(self):
@@ -26,5 +41,8 @@ class Submission(db.Model):
             'answer_sheet_file': self.answer_sheet_file,
             'grade': self.grade,
             'is_published': self.is_published,
+            'status': self.status,
+            'total_awarded': self.total_awarded,
+            'total_max': self.total_max,
             'submitted_at': self.submitted_at.isoformat() if self.submitted_at else None
         } 
\ No newline at end of file
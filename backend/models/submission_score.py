@@ -0,0 +1,25 @@
+from extensions import db
+
+class SubmissionScore(db.Model):
+    """
+    Score awarded for a single question of a submission, parsed from its grade HTML
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, index=True)
+    section = db.Column(db.String(100))
+    question = db.Column(db.String(50), nullable=False)
+    awarded = db.Column(db.Float, nullable=False)
+    max_marks = db.Column(db.Float, nullable=False)
+    
+    submission = db.relationship('Submission', backref=db.backref('scores', lazy=True, cascade='all, delete-orphan'))
+    
+    def to_dict(self):
+        """
+        Convert score object to dictionary for API responses
+        """
+        return {
+            'section': self.section,
+            'question': self.question,
+            'awarded': self.awarded,
+            'max_marks': self.max_marks
+        }
@@ -1,6 +1,10 @@
 from services.auth_service import AuthService
 from services.exam_service import ExamService
 from services.submission_service import SubmissionService
+from services.grading_service import GradingService, GradingWorkerPool
+from services.score_service import ScoreService
+from services.storage_service import StorageService
+from services.stats_service import StatsService
 
 # This makes it possible to import services directly from services package
 # Example: from services import AuthService, ExamService
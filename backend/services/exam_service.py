@@ -1,13 +1,30 @@
 from flask import session
-from models import Exam, User, Submission
+from models import Exam, User, Submission, ExamStats
 from extensions import db
-from utils import save_file
+from utils import save_file, rubric_handles, observe_stage, keyset_page, listing_columns, format_listing_row
 import random
 import string
 
 class ExamService:
     """Service for handling exam-related operations"""
     
+    # Fields the teacher submission listing can return (?fields=), by response name
+    LISTING_FIELDS = {
+        'id': Submission.id,
+        'student_name': User.username,
+        'exam_title': Exam.title,
+        'exam_code': Exam.exam_code,
+        'submitted_at': Submission.submitted_at,
+        'is_published': Submission.is_published,
+        'status': Submission.status,
+        'total_awarded': Submission.total_awarded,
+        'total_max': Submission.total_max,
+        'grade': Submission.grade,
+        'answer_sheet_url': Submission.answer_sheet_file
+    }
+    # The grade body is deferred: it is large and only shown for one submission at a time
+    DEFAULT_LISTING_FIELDS = tuple(name for name in LISTING_FIELDS if name != 'grade')
+    
     @staticmethod
     def get_teacher_exams(teacher_id=None):
         """
@@ -47,23 +64,33 @@ class ExamService:
         
         try:
             # Upload files to Cloudinary
-            question_paper_url = save_file(question_paper)
-            rubric_url = save_file(rubric_file)
+            with observe_stage('upload', exam_code):
+                question_paper_stored = save_file(question_paper)
+                rubric_stored = save_file(rubric_file)
             
-            if not question_paper_url or not rubric_url:
+            if not question_paper_stored or not rubric_stored:
                 return False, "Error uploading files"
             
+            # Upload the rubric to Gemini once so grading calls can refer to it
+            rubric_file.seek(0)
+            rubric_handle = rubric_handles.try_upload(rubric_file.read(), display_name=f"{exam_code} rubric")
+            
             # Create new exam with Cloudinary URLs
             exam = Exam(
                 title=title,
                 teacher_id=teacher_id,
-                question_paper_file=question_paper_url,
-                rubric_file=rubric_url,
+                question_paper_file=question_paper_stored.url,
+                question_paper_sha256=question_paper_stored.sha256,
+                rubric_file=rubric_stored.url,
+                rubric_sha256=rubric_stored.sha256,
                 exam_code=exam_code
             )
+            exam.rubric_handle = rubric_handle
+            exam.stats = ExamStats()
             
             db.session.add(exam)
-            db.session.commit()
+            with observe_stage('db_commit', exam_code):
+                db.session.commit()
             
             return True, exam
             
@@ -86,40 +113,85 @@ class ExamService:
         return Exam.query.filter_by(exam_code=exam_code).first()
 
     @staticmethod
-    def get_teacher_submissions(teacher_id=None):
+    def get_teacher_exam(exam_id, teacher_id=None):
         """
-        Get all submissions for exams created by a specific teacher
+        Get an exam if it belongs to a specific teacher
         
         Args:
+            exam_id (int): The exam ID
             teacher_id (int, optional): Teacher's ID. If not provided, uses the current user's ID.
             
         Returns:
-            list: List of submissions with student and exam information
+            Exam: The exam if found and owned by the teacher, None otherwise
         """
         if teacher_id is None:
             teacher_id = session.get('user_id')
             
-        # Query all submissions for exams created by this teacher
-        submissions_query = (Submission.query
-                           .join(Exam)
-                           .join(User, Submission.student_id == User.id)
-                           .filter(Exam.teacher_id == teacher_id)
-                           .order_by(Submission.submitted_at.desc()))
+        return Exam.query.filter_by(id=exam_id, teacher_id=teacher_id).first()
+
+    @staticmethod
+    def teacher_submissions_query(teacher_id, exam_id=None, published=None, status=None, fields=None):
+        """
+        Build the query listing submissions to a teacher's exams, newest first
         
-        submissions = submissions_query.all()
+        Selects only the requested columns, so the listing is a single SELECT with
+        no ORM objects or lazy loads, and the exam and user tables are only joined
+        for the fields that need them. Filtering on the submission's own copy of the
+        teacher ID lets ix_submission_teacher_submitted serve the whole listing in
+        order, however many exams the teacher has; the check-query-plans command
+        verifies that.
         
-        # Format the submissions for API response
-        formatted_submissions = []
-        for submission in submissions:
-            formatted_submissions.append({
-                'id': submission.id,
-                'student_name': submission.student.username,
-                'exam_title': submission.exam.title,
-                'exam_code': submission.exam.exam_code,
-                'submitted_at': submission.submitted_at.isoformat(),
-                'is_published': submission.is_published,
-                'grade': submission.grade,
-                'answer_sheet_url': submission.answer_sheet_file
-            })
+        Args:
+            teacher_id (int): Teacher's ID
+            exam_id (int, optional): Only list submissions to this exam
+            published (bool, optional): Only list published (True) or unpublished (False) grades
+            status (str, optional): Only list submissions in this grading status
+            fields (tuple, optional): Names from LISTING_FIELDS, DEFAULT_LISTING_FIELDS if not provided
+            
+        Returns:
+            Query: The listing query, yielding rows (always with id and submitted_at)
+        """
+        fields = listing_columns(fields or ExamService.DEFAULT_LISTING_FIELDS)
+        query = (db.session.query(*(ExamService.LISTING_FIELDS[name].label(name) for name in fields))
+                 .select_from(Submission))
+        if 'exam_title' in fields or 'exam_code' in fields:
+            query = query.join(Exam, Submission.exam_id == Exam.id)
+        if 'student_name' in fields:
+            query = query.join(User, Submission.student_id == User.id)
+        query = query.filter(Submission.teacher_id == teacher_id)
+        
+        if exam_id is not None:
+            query = query.filter(Submission.exam_id == exam_id)
+        if published is not None:
+            query = query.filter(Submission.is_published == published)
+        if status is not None:
+            query = query.filter(Submission.status == status)
+        return query.order_by(Submission.submitted_at.desc(), Submission.id.desc())
+    
+    @staticmethod
+    def get_teacher_submissions(teacher_id=None, exam_id=None, published=None, status=None, cursor=None, limit=None,
+                                fields=None):
+        """
+        Get submissions for exams created by a specific teacher, newest first
+        
+        Args:
+            teacher_id (int, optional): Teacher's ID. If not provided, uses the current user's ID.
+            exam_id (int, optional): Only list submissions to this exam
+            published (bool, optional): Only list published (True) or unpublished (False) grades
+            status (str, optional): Only list submissions in this grading status
+            cursor (tuple, optional): Decoded cursor returned with the previous page
+            limit (int, optional): Page size; all submissions if not provided
+            fields (tuple, optional): Names from LISTING_FIELDS, DEFAULT_LISTING_FIELDS if not provided
             
-        return formatted_submissions 
\ No newline at end of file
+        Returns:
+            tuple: (list of submissions with the requested fields, next cursor or None)
+        """
+        if teacher_id is None:
+            teacher_id = session.get('user_id')
+        
+        fields = fields or ExamService.DEFAULT_LISTING_FIELDS
+        query = ExamService.teacher_submissions_query(teacher_id, exam_id, published, status, fields)
+        submissions, next_cursor = keyset_page(query, Submission.submitted_at, Submission.id, cursor, limit)
+        
+        # Format the submissions for API response
+        return [format_listing_row(submission, fields) for submission in submissions], next_cursor
@@ -0,0 +1,594 @@
+from flask import current_app
+from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import aliased
+from models import Submission, GradingJob
+from extensions import db
+from services.score_service import ScoreService
+from services.stats_service import StatsService
+from utils import stream_grading, GradingError, PermanentGradingError, rubric_cache, rubric_handles, observe_stage, bind_exam
+from datetime import datetime, timedelta
+import threading
+import time
+import traceback
+
+# Set whenever a job is enqueued so idle workers in this process wake up immediately
+_wakeup = threading.Event()
+
+class GradingService:
+    """Service for the durable, database-backed grading queue"""
+
+    @staticmethod
+    def enqueue(submission, bypass_memo=False, concurrency_limit=None):
+        """
+        Queue a submission for grading
+
+        The job is added to the current session; the caller commits it together
+        with the submission so a committed submission always has a job.
+
+        Args:
+            submission (Submission): The submission to grade
+            bypass_memo (bool): Always call the model instead of reusing a memoized grade
+            concurrency_limit (int, optional): Most jobs of the submission's exam that may run at once
+
+        Returns:
+            GradingJob: The queued job
+        """
+        submission.status = 'queued'
+        job = GradingJob(submission=submission, exam_id=submission.exam_id, status='queued',
+                         bypass_memo=bypass_memo, concurrency_limit=concurrency_limit)
+        db.session.add(job)
+        return job
+
+    @staticmethod
+    def enqueue_exam(exam_id, concurrency, bypass_memo=False):
+        """
+        Queue every ungraded or failed submission of an exam for the grading workers
+
+        Each job carries the concurrency cap, which claim_next_job enforces, so a
+        large exam cannot take over every worker.
+
+        Args:
+            exam_id (int): The exam ID
+            concurrency (int): Most submissions of the exam graded at once
+            bypass_memo (bool): Always call the model instead of reusing memoized grades
+
+        Returns:
+            int: Number of submissions queued
+        """
+        submissions = GradingService.find_ungraded(exam_id)
+        for submission in submissions:
+            before = StatsService.snapshot(submission)
+            GradingService.enqueue(submission, bypass_memo=bypass_memo, concurrency_limit=concurrency)
+            StatsService.record_change(submission, before)
+        db.session.commit()
+        GradingService.wake_workers()
+        return len(submissions)
+
+    @staticmethod
+    def wake_workers():
+        """Wake idle grading workers in this process"""
+        _wakeup.set()
+
+    @staticmethod
+    def claim_next_job():
+        """
+        Atomically claim the oldest runnable job
+
+        A job is runnable when it is queued, or when it has been running for longer
+        than GRADING_JOB_TIMEOUT (its worker is assumed to have died), and its exam
+        has fewer running jobs than the job's concurrency_limit. Claiming is a
+        conditional UPDATE, so concurrent workers in any process never get the same job.
+
+        Returns:
+            GradingJob: The claimed job, or None if the queue is empty
+        """
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=current_app.config['GRADING_JOB_TIMEOUT'])
+        runnable = or_(
+            GradingJob.status == 'queued',
+            and_(GradingJob.status == 'running', GradingJob.started_at < stale_before)
+        )
+
+        candidates = (GradingJob.query
+                      .filter(runnable, GradingService._under_exam_cap(stale_before))
+                      .order_by(GradingJob.id)
+                      .limit(5)
+                      .all())
+
+        for candidate in candidates:
+            if GradingService.try_claim(candidate, now):
+                return candidate
+
+        return None
+
+    @staticmethod
+    def try_claim(job, now=None):
+        """
+        Claim a specific job if nobody else has claimed it since it was read
+
+        Args:
+            job (GradingJob): The job as last read from the database
+            now (datetime, optional): Claim timestamp
+
+        Returns:
+            bool: True if this caller now owns the job
+        """
+        now = now or datetime.utcnow()
+        stale_before = now - timedelta(seconds=current_app.config['GRADING_JOB_TIMEOUT'])
+        claimed = (db.session.query(GradingJob)
+                   .filter(GradingJob.id == job.id,
+                           GradingJob.status == job.status,
+                           GradingJob.attempts == job.attempts,
+                           GradingService._under_exam_cap(stale_before))
+                   .update({
+                       'status': 'running',
+                       'started_at': now,
+                       'attempts': job.attempts + 1
+                   }, synchronize_session=False))
+        db.session.commit()
+
+        if claimed == 1:
+            db.session.refresh(job)
+            return True
+        return False
+
+    @staticmethod
+    def _under_exam_cap(stale_before):
+        """Condition that a job's exam has fewer live running jobs than the job's cap"""
+        running = aliased(GradingJob)
+        live = (db.session.query(func.count(running.id))
+                .filter(running.exam_id == GradingJob.exam_id,
+                        running.status == 'running',
+                        running.started_at >= stale_before)
+                .scalar_subquery())
+        return or_(GradingJob.concurrency_limit.is_(None), live < GradingJob.concurrency_limit)
+
+    @staticmethod
+    def run_job(job):
+        """
+        Grade the submission behind a claimed job and record the outcome
+
+        Failed attempts are re-queued until GRADING_MAX_ATTEMPTS is reached, after
+        which the submission is marked as failed.
+
+        Args:
+            job (GradingJob): A job returned by claim_next_job
+
+        Returns:
+            bool: True if the submission was graded
+        """
+        submission = job.submission
+        exam = submission.exam
+
+        before = StatsService.snapshot(submission)
+        submission.status = 'grading'
+        StatsService.record_change(submission, before)
+        db.session.commit()
+
+        print(f"Starting grading process for submission {submission.id} (attempt {job.attempts})...")
+
+        try:
+            with bind_exam(exam.exam_code):
+                # Streamed so live viewers (stream_grade) see the grade as it is written
+                grading_result = "".join(GradingService._stream_job(job)).strip()
+        except Exception as e:
+            if not isinstance(e, GradingError):
+                print(traceback.format_exc())
+            GradingService._record_failure(job, e)
+            return False
+
+        GradingService._record_success(job, grading_result)
+        return True
+
+    @staticmethod
+    def _stream_job(job):
+        """
+        Grade the submission behind a claimed job, yielding the grade's fragments
+
+        The grade so far is also saved on the job every GRADING_PARTIAL_FLUSH_SECONDS,
+        so viewers in any process can follow it (see _follow).
+        """
+        submission = job.submission
+        exam = submission.exam
+        interval = current_app.config['GRADING_PARTIAL_FLUSH_SECONDS']
+        fragments = []
+        last_flush = time.monotonic()
+        for fragment in stream_grading(
+            submission.answer_sheet_file,
+            exam.rubric_file,
+            rubric_handle=GradingService.get_rubric_handle(exam),
+            bypass_memo=job.bypass_memo
+        ):
+            fragments.append(fragment)
+            yield fragment
+            if time.monotonic() - last_flush >= interval:
+                (db.session.query(GradingJob)
+                 .filter(GradingJob.id == job.id)
+                 .update({'partial_grade': "".join(fragments)}, synchronize_session=False))
+                db.session.commit()
+                last_flush = time.monotonic()
+
+    @staticmethod
+    def _record_success(job, grading_result):
+        """Store the grade and close the job"""
+        submission = job.submission
+        before = StatsService.snapshot(submission)
+        submission.grade = grading_result
+        submission.status = 'graded'
+        ScoreService.record_scores(submission)
+        StatsService.record_change(submission, before)
+        job.status = 'done'
+        job.last_error = None
+        job.partial_grade = None
+        job.finished_at = datetime.utcnow()
+        with observe_stage('db_commit', submission.exam.exam_code):
+            db.session.commit()
+        print(f"Submission {submission.id} updated with grade, result length: {len(grading_result)}")
+
+    @staticmethod
+    def _record_failure(job, error):
+        """Re-queue the job, or mark the submission as failed once attempts run out or on a permanent error"""
+        submission = job.submission
+        print(f"Error during grading of submission {submission.id}: {str(error)}")
+
+        before = StatsService.snapshot(submission)
+        job.last_error = str(error)
+        job.partial_grade = None
+        # Permanent errors (missing, oversized or rejected inputs) fail on the first attempt
+        retry = not isinstance(error, PermanentGradingError)
+        if retry and job.attempts < current_app.config['GRADING_MAX_ATTEMPTS']:
+            job.status = 'queued'
+            submission.status = 'queued'
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            submission.status = 'failed'
+            submission.grade = f"<p>Grading failed: {str(error)}</p>"
+            ScoreService.record_scores(submission)
+        StatsService.record_change(submission, before)
+        with observe_stage('db_commit', submission.exam.exam_code):
+            db.session.commit()
+
+    @staticmethod
+    def _release(job):
+        """Hand a claimed job back to the queue without using up an attempt"""
+        submission = job.submission
+        before = StatsService.snapshot(submission)
+        job.status = 'queued'
+        job.attempts = max(job.attempts - 1, 0)
+        job.started_at = None
+        job.partial_grade = None
+        submission.status = 'queued'
+        StatsService.record_change(submission, before)
+        db.session.commit()
+        GradingService.wake_workers()
+
+    @staticmethod
+    def stream_grade(submission):
+        """
+        Grade a submission while yielding progress events for a live view
+
+        If the submission has a queued job (or no grade yet) this caller claims the
+        job and streams the model output. If a worker is already grading it, the
+        partial grade that worker publishes is relayed until it finishes. The final
+        grade is persisted to the submission either way. If the client disconnects,
+        a job claimed here goes back to the queue without counting as an attempt.
+
+        Args:
+            submission (Submission): The submission to grade
+
+        Yields:
+            tuple: (event, data) with event one of 'status', 'chunk', 'reset' (a retry
+                started over, discard the chunks so far), 'done', 'error'
+        """
+        job = (GradingJob.query
+               .filter(GradingJob.submission_id == submission.id,
+                       GradingJob.status.in_(['queued', 'running']))
+               .order_by(GradingJob.id.desc())
+               .first())
+
+        if job is None and submission.status in ('queued', 'grading', 'failed'):
+            job = GradingService.start_job(submission.id)
+        elif job is not None and not (job.status == 'queued' and GradingService.try_claim(job)):
+            job = None
+
+        if job is None:
+            # Graded already, or another worker holds the job: follow its progress
+            yield from GradingService._follow(submission.id)
+            return
+
+        exam = submission.exam
+        before = StatsService.snapshot(submission)
+        submission.status = 'grading'
+        StatsService.record_change(submission, before)
+        db.session.commit()
+        yield 'status', {'status': submission.status}
+
+        fragments = []
+        try:
+            with bind_exam(exam.exam_code):
+                for fragment in GradingService._stream_job(job):
+                    fragments.append(fragment)
+                    yield 'chunk', {'html': fragment}
+        except GeneratorExit:
+            # Client disconnected; the workers take the job over
+            GradingService._release(job)
+            raise
+        except Exception as e:
+            if not isinstance(e, GradingError):
+                print(traceback.format_exc())
+            GradingService._record_failure(job, e)
+            yield 'error', {'status': submission.status, 'message': str(e)}
+            return
+
+        GradingService._record_success(job, "".join(fragments).strip())
+        yield 'done', {'status': submission.status, 'grade': submission.grade}
+
+    @staticmethod
+    def _follow(submission_id):
+        """Relay the status and partial grade of a submission graded elsewhere until it settles"""
+        deadline = time.monotonic() + current_app.config['GRADING_JOB_TIMEOUT']
+        last_status = None
+        shown = ''
+        while True:
+            db.session.expire_all()
+            submission = Submission.query.get(submission_id)
+            if submission.status in ('graded', 'failed'):
+                yield 'done', {'status': submission.status, 'grade': submission.grade}
+                return
+            if submission.status != last_status:
+                last_status = submission.status
+                yield 'status', {'status': submission.status}
+
+            partial = (db.session.query(GradingJob.partial_grade)
+                       .filter(GradingJob.submission_id == submission_id, GradingJob.status == 'running')
+                       .order_by(GradingJob.id.desc())
+                       .limit(1)
+                       .scalar()) or ''
+            if not partial.startswith(shown):
+                # A new attempt started over
+                yield 'reset', {}
+                shown = ''
+            if len(partial) > len(shown):
+                yield 'chunk', {'html': partial[len(shown):]}
+                shown = partial
+
+            if time.monotonic() > deadline:
+                yield 'error', {'status': submission.status, 'message': 'Timed out waiting for grading'}
+                return
+            time.sleep(current_app.config['GRADING_PARTIAL_FLUSH_SECONDS'])
+
+    @staticmethod
+    def get_rubric_handle(exam):
+        """
+        Get a usable rubric handle for an exam, re-uploading the rubric if it expired
+
+        Args:
+            exam (Exam): The exam being graded
+
+        Returns:
+            RubricHandle: A valid handle, or None to send the rubric inline
+        """
+        handle = exam.rubric_handle
+        if handle is not None and handle.is_valid():
+            return handle
+
+        try:
+            content = rubric_cache.get(exam.rubric_file)
+        except Exception as e:
+            print(f"Could not refresh rubric handle for exam {exam.id}: {e}")
+            return None
+
+        handle = rubric_handles.try_upload(content, display_name=f"{exam.exam_code} rubric", key=exam.rubric_file)
+        if handle is not None:
+            exam.rubric_handle = handle
+            db.session.commit()
+        return handle
+
+    @staticmethod
+    def process_next():
+        """
+        Claim and run a single job
+
+        Returns:
+            bool: True if a job was processed, False if the queue was empty
+        """
+        job = GradingService.claim_next_job()
+        if job is None:
+            return False
+
+        GradingService.run_job(job)
+        return True
+
+    @staticmethod
+    def find_ungraded(exam_id):
+        """
+        Find submissions of an exam that still need a grade
+
+        Submissions that are already graded, or that have a queued or running job,
+        are skipped, so regrading an exam is safe to repeat.
+
+        Args:
+            exam_id (int): The exam ID
+
+        Returns:
+            list: Submissions to grade
+        """
+        active = (db.session.query(GradingJob.submission_id)
+                  .filter(GradingJob.status.in_(['queued', 'running'])))
+
+        return (Submission.query
+                .filter(Submission.exam_id == exam_id,
+                        Submission.id.notin_(active),
+                        Submission.status.in_(['queued', 'grading', 'failed']))
+                .order_by(Submission.id)
+                .all())
+
+    @staticmethod
+    def start_job(submission_id, bypass_memo=False):
+        """
+        Create an already-claimed job for a submission
+
+        The job is inserted as running so background workers never pick it up;
+        if this process dies, the job is re-claimed after GRADING_JOB_TIMEOUT.
+
+        Args:
+            submission_id (int): The submission ID
+            bypass_memo (bool): Always call the model instead of reusing a memoized grade
+
+        Returns:
+            GradingJob: The running job, or None if the submission already has an active job
+        """
+        active = (GradingJob.query
+                  .filter(GradingJob.submission_id == submission_id,
+                          GradingJob.status.in_(['queued', 'running']))
+                  .first())
+        if active is not None:
+            return None
+
+        exam_id = db.session.query(Submission.exam_id).filter(Submission.id == submission_id).scalar()
+        job = GradingJob(submission_id=submission_id, exam_id=exam_id, status='running', attempts=1,
+                         started_at=datetime.utcnow(), bypass_memo=bypass_memo)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    @staticmethod
+    def regrade(submission_id, teacher_id):
+        """
+        Queue a deliberate regrade of a submission, bypassing the grade memo
+
+        Args:
+            submission_id (int): The submission ID
+            teacher_id (int): ID of the teacher requesting the regrade
+
+        Returns:
+            tuple: (success, submission or error_message)
+        """
+        submission = Submission.query.get(submission_id)
+        if not submission:
+            return False, "Submission not found"
+
+        if submission.exam.teacher_id != teacher_id:
+            return False, "Unauthorized access"
+
+        active = (GradingJob.query
+                  .filter(GradingJob.submission_id == submission.id,
+                          GradingJob.status.in_(['queued', 'running']))
+                  .first())
+        if active is not None:
+            return False, "Submission is already being graded"
+
+        try:
+            before = StatsService.snapshot(submission)
+            GradingService.enqueue(submission, bypass_memo=True)
+            StatsService.record_change(submission, before)
+            db.session.commit()
+            GradingService.wake_workers()
+            return True, submission
+        except Exception as e:
+            print(f"Error queueing regrade: {str(e)}")
+            db.session.rollback()
+            return False, str(e)
+
+    @staticmethod
+    def get_exam_progress(exam_id):
+        """
+        Count the submissions of an exam by grading status
+
+        Args:
+            exam_id (int): The exam ID
+
+        Returns:
+            dict: Number of submissions per status, plus the total
+        """
+        rows = (db.session.query(Submission.status, func.count(Submission.id))
+                .filter(Submission.exam_id == exam_id)
+                .group_by(Submission.status)
+                .all())
+
+        progress = {'queued': 0, 'grading': 0, 'graded': 0, 'failed': 0}
+        for status, count in rows:
+            progress[status] = progress.get(status, 0) + count
+        progress['total'] = sum(progress.values())
+        return progress
+
+    @staticmethod
+    def get_status(submission_id, user_id, role):
+        """
+        Get the grading status of a submission
+
+        Args:
+            submission_id (int): The submission ID
+            user_id (int): ID of the requesting user
+            role (str): Role of the requesting user
+
+        Returns:
+            tuple: (success, status dict or error_message)
+        """
+        submission = Submission.query.get(submission_id)
+        if not submission:
+            return False, "Submission not found"
+
+        if role == 'teacher':
+            authorized = submission.exam.teacher_id == user_id
+        else:
+            authorized = submission.student_id == user_id
+        if not authorized:
+            return False, "Unauthorized access"
+
+        job = (GradingJob.query
+               .filter_by(submission_id=submission.id)
+               .order_by(GradingJob.id.desc())
+               .first())
+
+        return True, {
+            'submission_id': submission.id,
+            'status': submission.status,
+            'attempts': job.attempts if job else 0,
+            'error': job.last_error if job and submission.status == 'failed' else None
+        }
+
+
+class GradingWorkerPool:
+    """Pool of background threads that drain the grading queue"""
+
+    def __init__(self, app, size, poll_interval=1.0):
+        self.app = app
+        self.size = size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads"""
+        for i in range(self.size):
+            thread = threading.Thread(target=self._run, name=f"grading-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"Started {self.size} grading workers")
+
+    def stop(self, timeout=None):
+        """Signal the workers to stop and wait for them to finish their current job"""
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            processed = False
+            with self.app.app_context():
+                try:
+                    processed = GradingService.process_next()
+                except Exception as e:
+                    print(f"Grading worker error: {str(e)}")
+                    print(traceback.format_exc())
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+            if not processed:
+                _wakeup.wait(self.poll_interval)
+                _wakeup.clear()
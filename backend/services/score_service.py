@@ -0,0 +1,66 @@
+from models import Submission, SubmissionScore
+from extensions import db
+from services.stats_service import StatsService
+from utils import parse_grade_scores
+
+class ScoreService:
+    """Service for the structured per-question scores parsed from grade HTML"""
+
+    @staticmethod
+    def record_scores(submission):
+        """
+        Replace a submission's question scores and totals with those parsed from its grade
+
+        The changes are added to the current session; the caller commits them together
+        with the grade so scores never drift from the HTML.
+
+        Args:
+            submission (Submission): The submission whose grade changed
+
+        Returns:
+            list: The new SubmissionScore rows
+        """
+        SubmissionScore.query.filter_by(submission_id=submission.id).delete(synchronize_session=False)
+
+        scores = [SubmissionScore(submission_id=submission.id, **score)
+                  for score in parse_grade_scores(submission.grade)]
+        db.session.add_all(scores)
+
+        if scores:
+            submission.total_awarded = sum(score.awarded for score in scores)
+            submission.total_max = sum(score.max_marks for score in scores)
+        else:
+            submission.total_awarded = None
+            submission.total_max = None
+        return scores
+
+    @staticmethod
+    def rebuild_scores(exam_id=None, batch_size=200):
+        """
+        Re-parse the grades of existing submissions
+
+        Args:
+            exam_id (int, optional): Only rebuild the submissions of this exam
+            batch_size (int): Number of submissions committed at a time
+
+        Returns:
+            int: Number of submissions processed
+        """
+        query = Submission.query.order_by(Submission.id)
+        if exam_id is not None:
+            query = query.filter_by(exam_id=exam_id)
+
+        processed = 0
+        last_id = 0
+        while True:
+            batch = query.filter(Submission.id > last_id).limit(batch_size).all()
+            if not batch:
+                break
+            for submission in batch:
+                before = StatsService.snapshot(submission)
+                ScoreService.record_scores(submission)
+                StatsService.record_change(submission, before)
+            db.session.commit()
+            processed += len(batch)
+            last_id = batch[-1].id
+        return processed
@@ -0,0 +1,141 @@
+from sqlalchemy import func, case
+from models import Exam, Submission, ExamStats
+from extensions import db
+
+# Counters added to ExamStats by each submission, in column order
+COUNTERS = ('submitted', 'graded', 'failed', 'published', 'scored', 'awarded_sum', 'max_sum')
+
+class StatsService:
+    """Service for the per-exam counters in ExamStats"""
+
+    @staticmethod
+    def snapshot(submission):
+        """
+        Capture what a submission contributes to its exam's counters
+
+        Take a snapshot before changing a submission and pass it to record_change
+        afterwards.
+
+        Args:
+            submission (Submission): The submission
+
+        Returns:
+            tuple: The submission's contribution, in COUNTERS order
+        """
+        scored = submission.total_awarded is not None and submission.total_max is not None
+        return (
+            1,
+            int(submission.status == 'graded'),
+            int(submission.status == 'failed'),
+            int(bool(submission.is_published)),
+            int(scored),
+            submission.total_awarded if scored else 0.0,
+            submission.total_max if scored else 0.0,
+        )
+
+    @staticmethod
+    def record_change(submission, before=None):
+        """
+        Apply a submission's change to its exam's counters
+
+        The counters are updated with a relative UPDATE in the current session, so
+        they commit (or roll back) together with the submission and concurrent
+        changes to the same exam never overwrite each other.
+
+        Args:
+            submission (Submission): The submission, after the change
+            before (tuple, optional): snapshot() taken before the change; None for a new submission
+        """
+        after = StatsService.snapshot(submission)
+        before = before or (0,) * len(COUNTERS)
+        deltas = {name: new - old for name, new, old in zip(COUNTERS, after, before) if new != old}
+        if not deltas:
+            return
+
+        updated = (ExamStats.query
+                   .filter(ExamStats.exam_id == submission.exam_id)
+                   .update({getattr(ExamStats, name): getattr(ExamStats, name) + delta
+                            for name, delta in deltas.items()},
+                           synchronize_session=False))
+        if not updated:
+            # Exams created before the table existed: count their submissions once,
+            # including this change (the flush makes it visible to the query)
+            db.session.flush()
+            StatsService.rebuild(submission.exam_id, commit=False)
+
+    @staticmethod
+    def rebuild(exam_id=None, commit=True):
+        """
+        Recompute exam counters from the submissions, correcting any drift
+
+        Args:
+            exam_id (int, optional): Only rebuild the counters of this exam
+            commit (bool): Commit the rebuilt counters
+
+        Returns:
+            int: Number of exams whose counters changed
+        """
+        graded = Submission.status == 'graded'
+        scored = Submission.total_awarded.isnot(None) & Submission.total_max.isnot(None)
+        totals = (db.session.query(
+                      Submission.exam_id,
+                      func.count(Submission.id),
+                      func.sum(case((graded, 1), else_=0)),
+                      func.sum(case((Submission.status == 'failed', 1), else_=0)),
+                      func.sum(case((Submission.is_published.is_(True), 1), else_=0)),
+                      func.sum(case((scored, 1), else_=0)),
+                      func.sum(case((scored, Submission.total_awarded), else_=0.0)),
+                      func.sum(case((scored, Submission.total_max), else_=0.0))
+                  )
+                  .group_by(Submission.exam_id))
+        exams = db.session.query(Exam.id)
+        existing = ExamStats.query
+        if exam_id is not None:
+            totals = totals.filter(Submission.exam_id == exam_id)
+            exams = exams.filter(Exam.id == exam_id)
+            existing = existing.filter(ExamStats.exam_id == exam_id)
+
+        counts = {row[0]: tuple(value or 0 for value in row[1:]) for row in totals}
+        stats = {row.exam_id: row for row in existing}
+
+        changed = 0
+        for (exam,) in exams:
+            values = counts.get(exam, (0,) * len(COUNTERS))
+            row = stats.get(exam)
+            if row is None:
+                row = ExamStats(exam_id=exam)
+                db.session.add(row)
+            elif tuple(getattr(row, name) for name in COUNTERS) == values:
+                continue
+            for name, value in zip(COUNTERS, values):
+                setattr(row, name, value)
+            changed += 1
+
+        if commit:
+            db.session.commit()
+        return changed
+
+    @staticmethod
+    def get_teacher_stats(teacher_id):
+        """
+        Get the counters of every exam created by a teacher
+
+        Reads one row per exam, however many submissions there are.
+
+        Args:
+            teacher_id (int): Teacher's ID
+
+        Returns:
+            list: Exam counters, newest exam first
+        """
+        rows = (db.session.query(Exam.id, Exam.title, Exam.exam_code, ExamStats)
+                .outerjoin(ExamStats, ExamStats.exam_id == Exam.id)
+                .filter(Exam.teacher_id == teacher_id)
+                .order_by(Exam.created_at.desc())
+                .all())
+
+        summaries = []
+        for exam_id, title, exam_code, stats in rows:
+            stats = stats or ExamStats(exam_id=exam_id, **{name: 0 for name in COUNTERS})
+            summaries.append({'title': title, 'exam_code': exam_code, **stats.to_dict()})
+        return summaries
@@ -0,0 +1,61 @@
+from sqlalchemy import func, union_all
+from models import Exam, Submission
+from extensions import db
+from utils.blob_store import LocalBlobStore
+from utils import storage
+
+class StorageService:
+    """Service for the content-addressed files of the storage backend"""
+
+    @staticmethod
+    def reference_counts():
+        """
+        Count the references to each stored content hash
+
+        Every Exam question paper, Exam rubric and Submission answer sheet counts as
+        one reference to its file's SHA-256.
+
+        Returns:
+            dict: Reference count per SHA-256
+        """
+        references = union_all(
+            db.select(Exam.question_paper_sha256.label('sha256')),
+            db.select(Exam.rubric_sha256.label('sha256')),
+            db.select(Submission.answer_sheet_sha256.label('sha256'))
+        ).subquery()
+
+        rows = db.session.execute(
+            db.select(references.c.sha256, func.count())
+            .where(references.c.sha256.isnot(None))
+            .group_by(references.c.sha256)
+        ).all()
+        return {sha256: count for sha256, count in rows}
+
+    @staticmethod
+    def collect_garbage(grace_seconds, dry_run=False):
+        """
+        Delete stored files that no Exam or Submission references
+
+        Files younger than ``grace_seconds`` are kept even when unreferenced, since the
+        row referencing a new upload is committed after the file is stored.
+
+        Args:
+            grace_seconds (int): Minimum age of a file before it can be deleted
+            dry_run (bool): Only report what would be deleted
+
+        Returns:
+            dict: Blobs kept and deleted, and bytes freed
+        """
+        counts = StorageService.reference_counts()
+
+        result = {'kept': 0, 'deleted': 0, 'bytes_freed': 0}
+        for key, size, age in storage.iter_blobs():
+            if counts.get(LocalBlobStore.sha256_of(key)) or age < grace_seconds:
+                result['kept'] += 1
+                continue
+
+            if not dry_run:
+                storage.delete(key)
+            result['deleted'] += 1
+            result['bytes_freed'] += size
+        return result
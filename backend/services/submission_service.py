@@ -1,12 +1,30 @@
 from flask import session
-from models import Submission, Exam, User
+from models import Submission, Exam
 from extensions import db
-from utils import save_file, extract_rubric_text, extract_pdf_text, grade_response
-import time
+from utils import save_file, observe_stage, page_previews, keyset_page, listing_columns, format_listing_row
+from services.grading_service import GradingService
+from services.score_service import ScoreService
+from services.stats_service import StatsService
 
 class SubmissionService:
     """Service for handling submission-related operations"""
     
+    # Fields the student submission listing can return (?fields=), by response name
+    LISTING_FIELDS = {
+        'id': Submission.id,
+        'exam_title': Exam.title,
+        'exam_code': Exam.exam_code,
+        'submitted_at': Submission.submitted_at,
+        'is_published': Submission.is_published,
+        'status': Submission.status,
+        'total_awarded': Submission.total_awarded,
+        'total_max': Submission.total_max,
+        'grade': Submission.grade,
+        'answer_sheet_url': Submission.answer_sheet_file
+    }
+    # The grade body is deferred: it is large and only shown for one submission at a time
+    DEFAULT_LISTING_FIELDS = tuple(name for name in LISTING_FIELDS if name != 'grade')
+    
     @staticmethod
     def submit_answer(exam_code, answer_sheet, student_id=None):
         """
@@ -30,48 +48,30 @@ class SubmissionService:
         
         try:
             # Upload the answer sheet to Cloudinary
-            answer_sheet_url = save_file(answer_sheet)
-            if not answer_sheet_url:
+            with observe_stage('upload', exam.exam_code):
+                answer_sheet_stored = save_file(answer_sheet)
+            if not answer_sheet_stored:
                 return False, "Error uploading answer sheet"
             
             # Create submission record
             submission = Submission(
                 student_id=student_id,
                 exam_id=exam.id,
-                answer_sheet_file=answer_sheet_url
+                teacher_id=exam.teacher_id,
+                answer_sheet_file=answer_sheet_stored.url,
+                answer_sheet_sha256=answer_sheet_stored.sha256
             )
             
             db.session.add(submission)
-            db.session.commit()
             
-            # Start the grading process in the background (simplified for now)
-            # In a real implementation, this should be a background task
-            try:
-                print(f"Starting grading process for submission {submission.id}...")
-                
-                # We now pass the URLs directly to the grade_response function
-                rubric_url = exam.rubric_file
-                answer_sheet_url = submission.answer_sheet_file
-                
-                print(f"Sending URLs for grading... Rubric: {rubric_url}, Answer sheet: {answer_sheet_url}")
-                
-                # Grade the response using the URLs
-                grading_result = grade_response(answer_sheet_url, rubric_url)
-                print(f"Grading completed, result length: {len(grading_result)}")
-                
-                # Update the submission with the grade
-                submission.grade = grading_result
-                db.session.commit()
-                print(f"Submission {submission.id} updated with grade")
-                
-            except Exception as grading_error:
-                print(f"Error during grading: {str(grading_error)}")
-                import traceback
-                print(traceback.format_exc())
-                # Don't fail the submission if grading fails
-                # Just continue without a grade
-                submission.grade = f"<p>Grading failed: {str(grading_error)}</p>"
+            # Queue the submission for the background grading workers; the job and
+            # the exam counters are committed in the same transaction as the submission
+            GradingService.enqueue(submission)
+            StatsService.record_change(submission)
+            with observe_stage('db_commit', exam.exam_code):
                 db.session.commit()
+            GradingService.wake_workers()
+            print(f"Submission {submission.id} queued for grading")
             
             return True, submission
             
@@ -83,41 +83,129 @@ class SubmissionService:
             return False, str(e)
     
     @staticmethod
-    def get_student_submissions(student_id=None):
+    def student_submissions_query(student_id, exam_id=None, published=None, status=None, fields=None):
+        """
+        Build the query listing a student's submissions, newest first
+        
+        Selects only the requested columns, so the listing is a single SELECT with
+        no ORM objects or lazy loads, and the exam table is only joined for the exam
+        title and code. Served by ix_submission_student_submitted; the
+        check-query-plans command verifies that.
+        
+        Args:
+            student_id (int): Student's ID
+            exam_id (int, optional): Only list submissions to this exam
+            published (bool, optional): Only list published (True) or unpublished (False) grades
+            status (str, optional): Only list submissions in this grading status
+            fields (tuple, optional): Names from LISTING_FIELDS, DEFAULT_LISTING_FIELDS if not provided
+            
+        Returns:
+            Query: The listing query, yielding rows (always with id and submitted_at)
+        """
+        # is_published is always selected so unpublished grades can be withheld
+        fields = listing_columns(fields or SubmissionService.DEFAULT_LISTING_FIELDS,
+                                 required=('id', 'submitted_at', 'is_published'))
+        query = (db.session.query(*(SubmissionService.LISTING_FIELDS[name].label(name) for name in fields))
+                 .select_from(Submission))
+        if 'exam_title' in fields or 'exam_code' in fields:
+            query = query.join(Exam, Submission.exam_id == Exam.id)
+        query = query.filter(Submission.student_id == student_id)
+        
+        if exam_id is not None:
+            query = query.filter(Submission.exam_id == exam_id)
+        if published is not None:
+            query = query.filter(Submission.is_published == published)
+        if status is not None:
+            query = query.filter(Submission.status == status)
+        return query.order_by(Submission.submitted_at.desc(), Submission.id.desc())
+    
+    @staticmethod
+    def get_student_submissions(student_id=None, exam_id=None, published=None, status=None, cursor=None, limit=None,
+                                fields=None):
         """
-        Get all submissions by a specific student
+        Get submissions by a specific student, newest first
         
         Args:
             student_id (int, optional): Student's ID. If not provided, uses the current user's ID.
+            exam_id (int, optional): Only list submissions to this exam
+            published (bool, optional): Only list published (True) or unpublished (False) grades
+            status (str, optional): Only list submissions in this grading status
+            cursor (tuple, optional): Decoded cursor returned with the previous page
+            limit (int, optional): Page size; all submissions if not provided
+            fields (tuple, optional): Names from LISTING_FIELDS, DEFAULT_LISTING_FIELDS if not provided
             
         Returns:
-            list: List of submissions with exam information
+            tuple: (list of submissions with the requested fields, next cursor or None)
         """
         if student_id is None:
             student_id = session.get('user_id')
-            
-        # Query all submissions by this student
-        submissions_query = (Submission.query
-                           .join(Exam)
-                           .filter(Submission.student_id == student_id)
-                           .order_by(Submission.submitted_at.desc()))
         
-        submissions = submissions_query.all()
+        fields = fields or SubmissionService.DEFAULT_LISTING_FIELDS
+        query = SubmissionService.student_submissions_query(student_id, exam_id, published, status, fields)
+        submissions, next_cursor = keyset_page(query, Submission.submitted_at, Submission.id, cursor, limit)
         
         # Format the submissions for API response
         formatted_submissions = []
         for submission in submissions:
-            formatted_submissions.append({
-                'id': submission.id,
-                'exam_title': submission.exam.title,
-                'exam_code': submission.exam.exam_code,
-                'submitted_at': submission.submitted_at.isoformat(),
-                'is_published': submission.is_published,
-                'grade': submission.grade if submission.is_published else None,
-                'answer_sheet_url': submission.answer_sheet_file
-            })
-            
-        return formatted_submissions
+            formatted = format_listing_row(submission, fields)
+            if not submission.is_published:
+                # Unpublished grades are not shown to students
+                for name in ('total_awarded', 'total_max', 'grade'):
+                    if name in formatted:
+                        formatted[name] = None
+            formatted_submissions.append(formatted)
+        
+        return formatted_submissions, next_cursor
+    
+    @staticmethod
+    def get_grade(submission_id, user_id, role):
+        """
+        Get the grade body of one submission
+        
+        Listings leave the grade out by default; clients fetch it here when a
+        submission is opened.
+        
+        Args:
+            submission_id (int): The submission ID
+            user_id (int): ID of the requesting user
+            role (str): Role of the requesting user
+            
+        Returns:
+            tuple: (success, grade dict or error_message)
+        """
+        row = (db.session.query(
+                    Submission.id,
+                    Submission.student_id,
+                    Exam.teacher_id,
+                    Submission.status,
+                    Submission.is_published,
+                    Submission.total_awarded,
+                    Submission.total_max,
+                    Submission.grade
+                )
+                .join(Exam, Submission.exam_id == Exam.id)
+                .filter(Submission.id == submission_id)
+                .first())
+        if not row:
+            return False, "Submission not found"
+        
+        if role == 'teacher':
+            authorized = row.teacher_id == user_id
+        else:
+            authorized = row.student_id == user_id
+        if not authorized:
+            return False, "Unauthorized access"
+        
+        # Students only see their grade once the teacher publishes it
+        hidden = role != 'teacher' and not row.is_published
+        return True, {
+            'id': row.id,
+            'status': row.status,
+            'is_published': row.is_published,
+            'total_awarded': None if hidden else row.total_awarded,
+            'total_max': None if hidden else row.total_max,
+            'grade': None if hidden else row.grade
+        }
     
     @staticmethod
     def publish_grade(submission_id, teacher_id=None):
@@ -145,7 +233,9 @@ class SubmissionService:
             
         try:
             # Publish the grade
+            before = StatsService.snapshot(submission)
             submission.is_published = True
+            StatsService.record_change(submission, before)
             db.session.commit()
             
             return True, submission
@@ -182,7 +272,10 @@ class SubmissionService:
             
         try:
             # Update the grade
+            before = StatsService.snapshot(submission)
             submission.grade = updated_grade
+            ScoreService.record_scores(submission)
+            StatsService.record_change(submission, before)
             db.session.commit()
             
             return True, submission
@@ -190,4 +283,44 @@ class SubmissionService:
         except Exception as e:
             print(f"Error updating grade: {str(e)}")
             db.session.rollback()
-            return False, str(e) 
\ No newline at end of file
+            return False, str(e) 
+    
+    @staticmethod
+    def get_page_preview(submission_id, page_number, width, user_id, role):
+        """
+        Get a JPEG preview of one page of a submission's answer sheet
+        
+        Args:
+            submission_id (int): The submission ID
+            page_number (int): One-based page number
+            width (int): Requested width in pixels
+            user_id (int): ID of the requesting user
+            role (str): Role of the requesting user
+            
+        Returns:
+            tuple: (success, path of the preview image or error_message)
+        """
+        submission = Submission.query.get(submission_id)
+        if not submission:
+            return False, "Submission not found"
+        
+        if role == 'teacher':
+            authorized = submission.exam.teacher_id == user_id
+        else:
+            authorized = submission.student_id == user_id
+        if not authorized:
+            return False, "Unauthorized access"
+        
+        try:
+            path = page_previews.get(
+                submission.answer_sheet_file,
+                page_number - 1,
+                width,
+                document_id=submission.answer_sheet_sha256
+            )
+        except IndexError as e:
+            return False, str(e)
+        except Exception as e:
+            print(f"Error rendering preview of submission {submission_id}: {e}")
+            return False, f"Could not render preview: {e}"
+        return True, path
@@ -4,10 +4,20 @@ from utils.file_utils import (
     save_file, 
     convert_pdf_to_image_and_upload,
     extract_pdf_text,
-    extract_rubric_text,
-    create_session_with_retry
+    extract_rubric_text
 )
-from utils.ai_utils import grade_response
+from utils.ai_utils import grade_response, run_grading, run_grading_async, stream_grading, GradingError, PermanentGradingError, rubric_handles
+from utils.http_client import http_client
+from utils.storage import storage, StoredFile
+from utils.file_serving import serve_upload
+from utils.grade_parser import parse_grade_scores
+from utils.rubric_cache import rubric_cache
+from utils.pdf_text import pdf_text
+from utils.page_previews import page_previews
+from utils.query_plans import explain, full_scans, sorts, count_queries
+from utils.pagination import decode_cursor, keyset_page, parse_fields, listing_columns, format_listing_row
+from utils.rate_limiter import gemini_limiter
+from utils.metrics import observe_stage, record_stage, bind_exam, render_metrics
 
 # This makes it possible to import utilities directly from utils package
 # Example: from utils import login_required, save_file
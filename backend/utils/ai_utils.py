@@ -1,87 +1,344 @@
-from flask import current_app
 from google import genai
+from google.genai import errors as genai_errors
 import os
+import asyncio
+import logging
 import httpx
 from dotenv import load_dotenv
+from utils.http_client import http_client, DownloadStatusError, DownloadTooLargeError
+from utils.rubric_cache import rubric_cache
+from utils.storage import storage
+from utils.rubric_handles import RubricHandleClient
+from utils import grade_memo
+from utils.rate_limiter import gemini_limiter
+from utils.metrics import observe_stage
+from utils.pdf_preflight import pdf_preflight, PreflightError
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 # Initialize the Gemini client at module level
 client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
+# Uploads rubrics once per exam so grading calls can refer to them by URI
+rubric_handles = RubricHandleClient(client, limiter=gemini_limiter)
 
-def grade_response(student_response, rubric_url):
+class GradingError(Exception):
+    """Raised when an answer sheet could not be graded"""
+
+
+class PermanentGradingError(GradingError):
+    """Raised when retrying cannot help, e.g. an input is missing, too large or rejected"""
+
+
+GRADING_MODEL = "gemini-2.0-flash"
+
+# Bump whenever GRADING_PROMPT changes so memoized grades from the old prompt are not reused
+GRADING_PROMPT_VERSION = "1"
+
+GRADING_PROMPT = """Grade this answer sheet according to the rubric provided. Format your response in HTML as follows:
+
+<h3>SECTION [NAME] ([TOTAL] marks)</h3>
+<p><strong>Q[number] ([max_marks])</strong>: [Brief feedback] - [awarded]/[max_marks]</p>
+
+There could be multiple choice questions. For these, the student might write the option in their response, e.g. 'B'. 
+In the rubric, for these questions, the correct option might be present, e.g. 'C'. If they mismatch, then deduct points for that question.
+Directly start your response with the grading without any preamble."""
+
+def run_grading(student_response, rubric_url, rubric_handle=None, bypass_memo=False):
     """
-    Grade a student's response using AI based on a rubric
+    Grade a student's response using AI, raising on failure
+    
+    Sync entry point for worker threads and Flask views. Identical answer sheet and
+    rubric contents are served from the grade memo instead of calling Gemini again.
     
     Args:
         student_response: URL to the student's answer sheet PDF
         rubric_url: URL to the rubric PDF
+        rubric_handle (RubricHandle, optional): Previously uploaded copy of the rubric.
+            The rubric is sent inline when the handle is missing, expired or rejected.
+        bypass_memo (bool): Always call the model, e.g. for a deliberate regrade
         
     Returns:
         str: The AI-generated grade and feedback
+        
+    Raises:
+        GradingError: If the inputs are missing, a download fails or the model call fails
+    """
+    _check_inputs(student_response, rubric_url)
+    answer_content, rubric_content = http_client.run_sync(fetch_grading_inputs(student_response, rubric_url))
+    
+    memo_key = grade_memo.make_key(answer_content, rubric_content, GRADING_PROMPT_VERSION, GRADING_MODEL)
+    if not bypass_memo:
+        memoized = grade_memo.lookup(memo_key)
+        if memoized is not None:
+            print("Grade memo hit, skipping AI grading")
+            return memoized
+    
+    answer_content, rubric_content = _preflight_inputs(answer_content, rubric_content)
+    grade = http_client.run_sync(grade_documents(answer_content, rubric_content, rubric_handle))
+    grade_memo.store(memo_key, grade)
+    return grade
+
+def stream_grading(student_response, rubric_url, rubric_handle=None, bypass_memo=False):
     """
-    # Log input parameters
-    print(f"Starting grading process...")
-    print(f"Rubric URL: {rubric_url}")
-    print(f"Student response URL: {student_response}")
+    Grade a student's response, yielding the model's HTML as it is generated
+    
+    Args:
+        student_response: URL to the student's answer sheet PDF
+        rubric_url: URL to the rubric PDF
+        rubric_handle (RubricHandle, optional): Previously uploaded copy of the rubric
+        bypass_memo (bool): Always call the model, e.g. for a deliberate regrade
+        
+    Yields:
+        str: Consecutive fragments of the grade; a memoized grade is yielded whole
+        
+    Raises:
+        GradingError: If the inputs are missing, a download fails or the model call fails
+    """
+    _check_inputs(student_response, rubric_url)
+    answer_content, rubric_content = http_client.run_sync(fetch_grading_inputs(student_response, rubric_url))
+    
+    memo_key = grade_memo.make_key(answer_content, rubric_content, GRADING_PROMPT_VERSION, GRADING_MODEL)
+    if not bypass_memo:
+        memoized = grade_memo.lookup(memo_key)
+        if memoized is not None:
+            print("Grade memo hit, skipping AI grading")
+            yield memoized
+            return
+    
+    answer_content, rubric_content = _preflight_inputs(answer_content, rubric_content)
+    fragments = []
+    for fragment in http_client.iter_sync(stream_grade_documents(answer_content, rubric_content, rubric_handle)):
+        fragments.append(fragment)
+        yield fragment
+    
+    grade = "".join(fragments).strip()
+    if not grade:
+        raise GradingError("Error: Model returned an empty grade")
+    print("AI grading complete, result length:", len(grade))
+    grade_memo.store(memo_key, grade)
+
+async def run_grading_async(student_response, rubric_url, rubric_handle=None):
+    """
+    Grade a student's response using AI, downloading the answer sheet and rubric concurrently
+    
+    Args:
+        student_response: URL to the student's answer sheet PDF
+        rubric_url: URL to the rubric PDF
+        rubric_handle (RubricHandle, optional): Previously uploaded copy of the rubric
+        
+    Returns:
+        str: The AI-generated grade and feedback
+        
+    Raises:
+        GradingError: If the inputs are missing, a download fails or the model call fails
+    """
+    _check_inputs(student_response, rubric_url)
+    answer_content, rubric_content = await fetch_grading_inputs(student_response, rubric_url)
+    answer_content, rubric_content = await asyncio.to_thread(_preflight_inputs, answer_content, rubric_content)
+    return await grade_documents(answer_content, rubric_content, rubric_handle)
+
+def _preflight_inputs(answer_content, rubric_content):
+    """Check both PDFs and shrink oversized ones before they are sent to the model"""
+    try:
+        return (
+            pdf_preflight.prepare(answer_content, 'Answer sheet'),
+            pdf_preflight.prepare(rubric_content, 'Rubric')
+        )
+    except PreflightError as e:
+        raise PermanentGradingError(f"Error: {e}") from e
+
+def _check_inputs(student_response, rubric_url):
+    """Validate the grading inputs"""
+    logger.debug("Starting grading: rubric %s, student response %s", rubric_url, student_response)
     
     # Check if inputs are valid
     if not student_response:
-        return "<p>Error: Student response is not provided.</p>"
+        raise PermanentGradingError("Error: Student response is not provided.")
         
     if not rubric_url:
-        return "<p>Error: Rubric is not provided.</p>"
+        raise PermanentGradingError("Error: Rubric is not provided.")
+
+async def fetch_grading_inputs(student_response, rubric_url):
+    """
+    Download the answer sheet and the rubric at the same time
+    
+    Returns:
+        tuple: (answer_content, rubric_content)
+    """
+    print("Downloading PDFs from Cloudinary...")
+    return await asyncio.gather(
+        _download_answer_sheet(student_response),
+        _download_rubric(rubric_url)
+    )
+
+async def grade_documents(answer_content, rubric_content, rubric_handle=None):
+    """
+    Ask Gemini to grade downloaded documents
     
+    Args:
+        answer_content (bytes): The answer sheet PDF
+        rubric_content (bytes): The rubric PDF, sent inline when the handle cannot be used
+        rubric_handle (RubricHandle, optional): Previously uploaded copy of the rubric
+        
+    Returns:
+        str: The AI-generated grade and feedback
+    """
+    use_handle = rubric_handle is not None and rubric_handle.is_valid()
+    inline_rubric = {"inline_data": {"mime_type": "application/pdf", "data": rubric_content}}
+    
+    # Request grading from AI, referring to the uploaded rubric when possible.
+    # Calls go through the process-wide limiter, which retries quota and server errors.
+    print("Starting AI grading process")
     try:
-        # Download PDFs from Cloudinary URLs for grading
-        print("Downloading PDFs from Cloudinary...")
-        rubric_response = httpx.get(rubric_url)
-        answer_response = httpx.get(student_response)
+        try:
+            rubric_part = rubric_handle.to_part() if use_handle else inline_rubric
+            with observe_stage('model'):
+                response = await gemini_limiter.call(lambda: _generate_grade(rubric_part, answer_content))
+        except genai_errors.ClientError as e:
+            if not use_handle or e.code == 429:
+                raise
+            # Handle expired or was deleted on the provider side
+            print(f"Rubric handle rejected ({e.code}), falling back to inline rubric")
+            with observe_stage('model'):
+                response = await gemini_limiter.call(lambda: _generate_grade(inline_rubric, answer_content))
+    except Exception as e:
+        print(f"Error using Gemini API: {str(e)}")
+        raise _model_error(e) from e
+
+    grade = (response.text or "").strip()
+    if not grade:
+        raise GradingError("Error: Model returned an empty grade")
+    print("AI grading complete, result length:", len(grade))
+    return grade
+
+async def stream_grade_documents(answer_content, rubric_content, rubric_handle=None):
+    """
+    Streaming variant of grade_documents
+    
+    Yields:
+        str: Consecutive fragments of the grade
+    """
+    inline_rubric = {"inline_data": {"mime_type": "application/pdf", "data": rubric_content}}
+    rubric_parts = [inline_rubric]
+    if rubric_handle is not None and rubric_handle.is_valid():
+        rubric_parts.insert(0, rubric_handle.to_part())
+    
+    print("Starting streaming AI grading process")
+    for index, rubric_part in enumerate(rubric_parts):
+        emitted = False
+        try:
+            with observe_stage('model'):
+                async for chunk in gemini_limiter.stream(lambda: _generate_grade_stream(rubric_part, answer_content)):
+                    if chunk.text:
+                        emitted = True
+                        yield chunk.text
+            return
+        except genai_errors.ClientError as e:
+            if emitted or index == len(rubric_parts) - 1 or e.code == 429:
+                print(f"Error using Gemini API: {str(e)}")
+                raise _model_error(e) from e
+            # Handle expired or was deleted on the provider side
+            print(f"Rubric handle rejected ({e.code}), falling back to inline rubric")
+        except Exception as e:
+            print(f"Error using Gemini API: {str(e)}")
+            raise GradingError(f"Error during grading: {str(e)}") from e
+
+async def _download_answer_sheet(url):
+    """Read the answer sheet from storage, or download it through the shared pooled client"""
+    key = storage.key_from_url(url)
+    try:
+        with observe_stage('answer_download'):
+            if key is not None:
+                # Uploads were already held to MAX_CONTENT_LENGTH
+                return await storage.aread(key)
+            response = await http_client.fetch(url)
+    except FileNotFoundError as e:
+        raise PermanentGradingError(f"Error: Answer sheet is missing from storage ({key})") from e
+    except DownloadTooLargeError as e:
+        raise PermanentGradingError(f"Error: Answer sheet is too large ({str(e)})") from e
+    except httpx.HTTPError as e:
+        raise GradingError(f"Error: Could not download answer sheet ({str(e)})") from e
         
-        if not rubric_response.status_code == 200:
-            print(f"Error downloading rubric: {rubric_response.status_code}")
-            return f"<p>Error: Could not download rubric (status {rubric_response.status_code})</p>"
-            
-        if not answer_response.status_code == 200:
-            print(f"Error downloading answer sheet: {answer_response.status_code}")
-            return f"<p>Error: Could not download answer sheet (status {answer_response.status_code})</p>"
-            
-        # Create grading prompt and request
-        print("Starting AI grading process")
-        prompt = """Grade this answer sheet according to the rubric provided. Format your response in HTML as follows:
+    if not response.status_code == 200:
+        print(f"Error downloading answer sheet: {response.status_code}")
+        error = PermanentGradingError if _is_permanent_status(response.status_code) else GradingError
+        raise error(f"Error: Could not download answer sheet (status {response.status_code})")
+    return response.content
 
-<h3>SECTION [NAME] ([TOTAL] marks)</h3>
-<p><strong>Q[number] ([max_marks])</strong>: [Brief feedback] - [awarded]/[max_marks]</p>
+async def _download_rubric(rubric_url):
+    """Download the rubric through the cache"""
+    # The rubric is shared by every submission to an exam, so it comes from the cache
+    try:
+        with observe_stage('rubric_download'):
+            return await rubric_cache.aget(rubric_url)
+    except FileNotFoundError as e:
+        raise PermanentGradingError("Error: Rubric is missing from storage") from e
+    except DownloadStatusError as e:
+        print(f"Error downloading rubric: {e.status_code}")
+        error = PermanentGradingError if _is_permanent_status(e.status_code) else GradingError
+        raise error(f"Error: Could not download rubric (status {e.status_code})") from e
+    except DownloadTooLargeError as e:
+        raise PermanentGradingError(f"Error: Rubric is too large ({str(e)})") from e
+    except httpx.HTTPError as e:
+        raise GradingError(f"Error: Could not download rubric ({str(e)})") from e
 
-There could be multiple choice questions. For these, the student might write the option in their response, e.g. 'B'. 
-In the rubric, for these questions, the correct option might be present, e.g. 'C'. If they mismatch, then deduct points for that question.
-Directly start your response with the grading without any preamble."""
+def _is_permanent_status(status_code):
+    """Whether an HTTP error status will not go away on retry"""
+    return 400 <= status_code < 500 and status_code not in (408, 429)
+
+def _model_error(error):
+    """Wrap a model call error, marking requests the API rejected as permanent"""
+    if isinstance(error, genai_errors.ClientError) and _is_permanent_status(error.code):
+        return PermanentGradingError(f"Error during grading: {str(error)}")
+    return GradingError(f"Error during grading: {str(error)}")
 
-        # Request grading from AI
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=[
-                {
-                    "parts": [
-                        {"text": prompt},
-                        {"inline_data": {
-                            "mime_type": "application/pdf",
-                            "data": rubric_response.content
-                        }},
-                        {"inline_data": {
-                            "mime_type": "application/pdf",
-                            "data": answer_response.content
-                        }}
-                    ]
-                }
+def _grading_contents(rubric_part, answer_content):
+    """Build the contents of a grading request"""
+    return [
+        {
+            "parts": [
+                {"text": GRADING_PROMPT},
+                rubric_part,
+                {"inline_data": {
+                    "mime_type": "application/pdf",
+                    "data": answer_content
+                }}
             ]
-        )
+        }
+    ]
+
+async def _generate_grade(rubric_part, answer_content):
+    """Send the grading request to Gemini"""
+    return await client.aio.models.generate_content(
+        model=GRADING_MODEL,
+        contents=_grading_contents(rubric_part, answer_content)
+    )
 
-        grade = response.text.strip()
-        print("AI grading complete, result length:", len(grade))
-        return grade
+async def _generate_grade_stream(rubric_part, answer_content):
+    """Send the grading request to Gemini, streaming the response"""
+    return await client.aio.models.generate_content_stream(
+        model=GRADING_MODEL,
+        contents=_grading_contents(rubric_part, answer_content)
+    )
+
+def grade_response(student_response, rubric_url):
+    """
+    Grade a student's response using AI based on a rubric
+    
+    Args:
+        student_response: URL to the student's answer sheet PDF
+        rubric_url: URL to the rubric PDF
         
+    Returns:
+        str: The AI-generated grade and feedback, or an HTML error message
+    """
+    try:
+        return run_grading(student_response, rubric_url)
+    except GradingError as e:
+        return f"<p>{str(e)}</p>"
     except Exception as e:
         import traceback
         print(f"Error using Gemini API: {str(e)}")
         print(traceback.format_exc())
-        return f"<p>Error during grading: {str(e)}</p>" 
\ No newline at end of file
+        return f"<p>Error during grading: {str(e)}</p>"
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+def atomic_write(path, data):
+    """
+    Write a file so readers see either the old content or all of the new content
+
+    The data goes to a temporary file in the same directory, which is then renamed
+    over ``path``.
+
+    Args:
+        path (str): Destination path; missing directories are created
+        data (bytes): Content to write
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,107 @@
+import os
+import re
+import time
+
+# Keys look like 'ab/cd/<sha256>.pdf'
+_KEY_PATTERN = re.compile(r'^([0-9a-f]{2})/([0-9a-f]{2})/([0-9a-f]{64})(\.[A-Za-z0-9]+)?$')
+
+class LocalBlobStore:
+    """
+    Content-addressed file store on local disk.
+
+    Files are stored once per SHA-256 under a two-level sharded layout
+    (``ab/cd/<sha256>.pdf``) so no directory grows past 65536 entries. Files arrive
+    as fully written temporary files on the same filesystem and are renamed into
+    place, so readers never see a partial blob. Storing content that is already
+    present costs no extra bytes.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @staticmethod
+    def key_for(sha256, ext=''):
+        """
+        Get the storage key for a content hash
+
+        Args:
+            sha256 (str): Hex digest of the content
+            ext (str): File extension including the dot, e.g. '.pdf'
+
+        Returns:
+            str: Relative key, e.g. 'ab/cd/abcd....pdf'
+        """
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{ext.lower()}"
+
+    @staticmethod
+    def sha256_of(key):
+        """Get the content hash encoded in a key, or None if it is not a blob key"""
+        match = _KEY_PATTERN.match(key)
+        return match.group(3) if match else None
+
+    def path_for(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def incoming_dir(self):
+        """Directory for temporary files that will be renamed into the store"""
+        return os.path.join(self.root, '.incoming')
+
+    def put(self, tmp_path, sha256, ext=''):
+        """
+        Move a fully written temporary file into the store
+
+        Args:
+            tmp_path (str): Temporary file, on the same filesystem as the store
+            sha256 (str): Hex digest of its content
+            ext (str): File extension including the dot
+
+        Returns:
+            tuple: (key, created) where created is False if the content was already stored
+        """
+        key = self.key_for(sha256, ext)
+        path = self.path_for(key)
+
+        try:
+            # Refresh the mtime so garbage collection treats it as newly referenced
+            os.utime(path)
+        except FileNotFoundError:
+            # Not stored, or collected just now; the temporary file becomes the blob
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            return key, True
+
+        # Only dropped once the blob is known to exist
+        os.remove(tmp_path)
+        return key, False
+
+    def delete(self, key):
+        """Remove a blob, ignoring blobs that are already gone"""
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def iter_blobs(self):
+        """
+        Iterate over every stored blob
+
+        Yields:
+            tuple: (key, size in bytes, age in seconds)
+        """
+        now = time.time()
+        for shard in _sorted_dirs(self.root):
+            for subshard in _sorted_dirs(os.path.join(self.root, shard)):
+                directory = os.path.join(self.root, shard, subshard)
+                for name in sorted(os.listdir(directory)):
+                    key = f"{shard}/{subshard}/{name}"
+                    if not _KEY_PATTERN.match(key):
+                        continue
+                    stat = os.stat(os.path.join(directory, name))
+                    yield key, stat.st_size, now - stat.st_mtime
+
+
+def _sorted_dirs(path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path)
+                  if len(name) == 2 and os.path.isdir(os.path.join(path, name)))
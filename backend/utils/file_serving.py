@@ -0,0 +1,94 @@
+import os
+from flask import current_app, request, Response, send_file, send_from_directory, stream_with_context, abort
+from utils.blob_store import LocalBlobStore
+from utils.storage import storage
+
+def serve_upload(filename):
+    """
+    Serve a file under /uploads
+
+    Content-addressed files (``blobs/ab/cd/<sha256>.pdf``) never change, so their
+    SHA-256 is a strong ETag and they are cached as immutable. Every file supports
+    If-None-Match and byte ranges, so PDF viewers can fetch pages lazily. Local
+    files can be handed off to the front proxy with X-Accel-Redirect
+    (UPLOADS_ACCEL_REDIRECT_PREFIX) or X-Sendfile (USE_X_SENDFILE).
+
+    Args:
+        filename (str): Path relative to /uploads
+
+    Returns:
+        Response: The file, a 206 partial response, or a 304
+    """
+    config = current_app.config
+    # Never expose temporary files (e.g. uploads still being spooled)
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+
+    key = storage.key_from_path(filename)
+    if key is None:
+        # Files saved before content addressing; their names are unique per upload
+        return send_from_directory(config['UPLOAD_FOLDER'], filename, max_age=config['UPLOADS_MAX_AGE'])
+
+    etag = LocalBlobStore.sha256_of(key)
+    if request.if_none_match.contains(etag):
+        return _immutable(Response(status=304), etag)
+
+    if storage.local_root:
+        path = storage.backend.store.path_for(key)
+        if not os.path.isfile(path):
+            abort(404)
+
+        accel_prefix = config['UPLOADS_ACCEL_REDIRECT_PREFIX']
+        if accel_prefix:
+            # nginx serves the bytes (ranges included) from an internal location
+            response = Response(mimetype=_mimetype(key))
+            response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{key}"
+            response.headers['Accept-Ranges'] = 'bytes'
+            return _immutable(response, etag)
+
+        # Handles Range and If-Range, and uses the server's sendfile/file_wrapper
+        response = send_file(path, mimetype=_mimetype(key), etag=etag, conditional=True)
+        # Only added by send_file to ranged requests; PDF viewers look for it on the first one
+        response.headers['Accept-Ranges'] = 'bytes'
+        return _immutable(response, etag)
+
+    return _immutable(_stream_from_storage(key), etag)
+
+def _stream_from_storage(key):
+    """Stream a file kept off the local disk (S3), honouring a single byte range"""
+    try:
+        size = storage.size(key)
+    except FileNotFoundError:
+        abort(404)
+
+    start, stop, status = 0, size, 200
+    if request.range is not None:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{size}"
+            return response
+        start, stop = byte_range
+        status = 206
+
+    body = storage.open(key, start if status == 206 else None, stop if status == 206 else None)
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    response = Response(
+        stream_with_context(iter(lambda: body.read(chunk_size), b'')),
+        status=status,
+        mimetype=_mimetype(key)
+    )
+    response.call_on_close(body.close)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Length'] = str(stop - start)
+    if status == 206:
+        response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{size}"
+    return response
+
+def _immutable(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['UPLOADS_IMMUTABLE_MAX_AGE']}, immutable"
+    return response
+
+def _mimetype(key):
+    return 'application/pdf' if key.endswith('.pdf') else 'application/octet-stream'
@@ -1,49 +1,29 @@
 import os
-import uuid
+import hashlib
 import time
+import tempfile
 import cloudinary
 from cloudinary import uploader
 import fitz  # PyMuPDF
-from flask import current_app, request
+from flask import current_app
 from werkzeug.utils import secure_filename
 import io
-from PyPDF2 import PdfReader
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from dotenv import load_dotenv
+from utils.page_pipeline import run_page_pipeline
+from utils.pdf_render import RenderOptions
+from utils.storage import storage
+from utils.pdf_text import pdf_text
+from utils.rubric_cache import rubric_cache
 
 def ensure_cloudinary_config():
     """
-    Ensure Cloudinary is properly configured with credentials from environment
+    Check that Cloudinary was configured at startup (see init_extensions)
     
     Returns:
-        bool: True if configured successfully, False otherwise
+        bool: True if credentials are configured, False otherwise
     """
-    load_dotenv()  # Load .env into os.environ
-    
-    cloud_name = os.getenv('CLOUDINARY_CLOUD_NAME')
-    api_key    = os.getenv('CLOUDINARY_API_KEY')
-    api_secret = os.getenv('CLOUDINARY_API_SECRET')
-    
-    if not (cloud_name and api_key and api_secret):
-        print("Cloudinary credentials not found in environment variables")
+    if not cloudinary.config().api_key:
+        print("Cloudinary credentials not configured")
         return False
-    
-    # Configure Cloudinary
-    cloudinary.config(
-        cloud_name=cloud_name,
-        api_key=api_key,
-        api_secret=api_secret
-    )
-    
-    # Verify configuration via attributes, not dict.get()
-    cfg = cloudinary.config()
-    if not cfg.api_key:
-        print("Cloudinary configuration failed")
-        return False
-        
-    print(f"Cloudinary configured successfully with cloud_name: {cfg.cloud_name}")
     return True
 
 def allowed_file(filename):
@@ -64,92 +44,90 @@ def allowed_file(filename):
         filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
     )
 
-def save_file(file, directory='uploads'):
+def spool_upload(file, directory, chunk_size=1024 * 1024):
     """
-    Save a file either to Cloudinary (if configured) or to local storage
+    Copy an uploaded file to a temporary file in fixed-size chunks
+    
+    The SHA-256 and size are computed while copying, so memory use stays at one
+    chunk regardless of the upload size.
     
     Args:
-        file: File to save
-        directory: Directory to save the file in (for local storage)
+        file: Uploaded file (werkzeug FileStorage)
+        directory (str): Directory for the temporary file; keep it on the same
+            filesystem as the final location so it can be renamed into place
+        chunk_size (int): Bytes copied per read
         
     Returns:
-        str: URL of the saved file
+        tuple: (temporary file path, SHA-256 hex digest, size in bytes)
     """
-    # Generate unique filename
-    _, ext = os.path.splitext(file.filename)
-    unique_filename = f"{str(uuid.uuid4())}{ext}"
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
     
-    # Try Cloudinary first
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
     try:
-        print(f"Uploading file: {file.filename} to Cloudinary")
-        
-        if not ensure_cloudinary_config():
-            raise ValueError("Failed to configure Cloudinary")
-        
-        file.seek(0)
-        # You can upload the FileStorage directly
-        upload_folder = f"{directory}/{unique_filename.split('.')[0]}"
-        print(f"Attempting Cloudinary upload to folder: {upload_folder}")
-        
-        response = uploader.upload(
-            file,
-            resource_type="auto",
-            folder=upload_folder,
-            use_filename=True,
-            unique_filename=True
-        )
-        
-        print(f"File successfully uploaded to Cloudinary: {response['secure_url']}")
-        return response['secure_url']
-        
-    except Exception as e:
-        print(f"Cloudinary upload error: {e}")
-        current_app.logger.warning(f"Failed to upload to Cloudinary, falling back to local storage: {e}")
-        
-        # Fall back to local storage
-        os.makedirs(os.path.join(current_app.config['UPLOAD_FOLDER'], directory), exist_ok=True)
-        file.seek(0)
-        
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], directory, unique_filename)
-        file.save(file_path)
-        
-        base_url = request.host_url.rstrip('/')
-        file_url = f"{base_url}/uploads/{directory}/{unique_filename}"
-        
-        print(f"File saved locally: {file_path}")
-        current_app.logger.info(f"File saved locally at: {file_path}")
-        return file_url
+        with os.fdopen(fd, 'wb') as out:
+            stream = file.stream
+            stream.seek(0)
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    
+    return tmp_path, digest.hexdigest(), size
 
-def create_session_with_retry():
+def save_file(file, directory='uploads'):
     """
-    Create a requests session with retry capability
+    Save a file with the configured storage backend
+    
+    The upload is first streamed to a temporary file (see ``spool_upload``), then
+    handed to the backend selected by STORAGE_BACKEND.
     
+    Args:
+        file: File to save
+        directory: Folder for backends with folder-based naming (Cloudinary)
+        
     Returns:
-        requests.Session: Session with retry capability
+        StoredFile: URL, SHA-256, size and storage key of the saved file
     """
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1,
-        status_forcelist=[429, 500, 502, 503, 504],
-        allowed_methods=["GET", "POST"]
+    _, ext = os.path.splitext(file.filename)
+    tmp_path, sha256, size = spool_upload(
+        file,
+        storage.incoming_dir(current_app.config['UPLOAD_FOLDER']),
+        current_app.config['UPLOAD_CHUNK_SIZE']
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session = requests.Session()
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-    return session
+    print(f"Received {file.filename}: {size} bytes, sha256 {sha256}")
+    
+    try:
+        stored = storage.save(tmp_path, sha256, ext, directory)
+        current_app.logger.info(f"Stored {file.filename} at {stored.url}")
+        return stored
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 def convert_pdf_to_image_and_upload(pdf_file, folder):
     """
     Convert PDF to images and upload to Cloudinary
     
+    Rendering, JPEG encoding and uploading run as overlapping pipeline stages with
+    their own concurrency (PDF_RENDER_WORKERS, PDF_ENCODE_WORKERS, PDF_UPLOAD_WORKERS)
+    and bounded queues in between, so CPU and network work overlap.
+    
     Args:
         pdf_file: The PDF file object
         folder (str): Cloudinary folder to upload to
         
     Returns:
-        list: List of URLs for the uploaded images
+        list: List of URLs for the uploaded images, in page order
     """
+    pdf_path = None
     try:
         if not ensure_cloudinary_config():
             raise ValueError("Failed to configure Cloudinary")
@@ -159,44 +137,59 @@ def convert_pdf_to_image_and_upload(pdf_file, folder):
         print(f"PDF content read, size: {len(pdf_content)} bytes")
         
         pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        uploaded_urls = []
-        print(f"PDF opened successfully, {pdf_document.page_count} pages found")
-
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            pix = page.get_pixmap(matrix=fitz.Matrix(300/72, 300/72))
-            
-            from PIL import Image
-            img_data = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            img_byte_array = io.BytesIO()
-            img_data.save(img_byte_array, format='JPEG', quality=95)
-            img_byte_array.seek(0)
-            
+        page_count = pdf_document.page_count
+        pdf_document.close()
+        print(f"PDF opened successfully, {page_count} pages found")
+        
+        max_pages = current_app.config['PDF_MAX_PAGES']
+        if page_count > max_pages:
+            raise ValueError(f"PDF has {page_count} pages, the limit is {max_pages}")
+        
+        # Render workers open the document from disk rather than receiving its bytes per page
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            tmp.write(pdf_content)
+            pdf_path = tmp.name
+        
+        base_name = secure_filename(pdf_file.filename).rsplit('.', 1)[0]
+        
+        def upload_page(page_num, page_image):
             max_attempts = 3
             for attempt in range(max_attempts):
                 try:
                     upload_result = uploader.upload(
-                        img_byte_array,
+                        io.BytesIO(page_image),
                         folder=folder,
                         quality='auto:best',
                         fetch_format='auto',
                         timeout=30,
-                        public_id=f"{secure_filename(pdf_file.filename).rsplit('.', 1)[0]}_page_{page_num + 1}"
+                        public_id=f"{base_name}_page_{page_num + 1}"
                     )
-                    uploaded_urls.append(upload_result['url'])
-                    break
+                    return upload_result['url']
                 except Exception as upload_error:
                     if attempt == max_attempts - 1:
                         raise upload_error
+                    # Only this upload worker waits; rendering and encoding carry on
                     time.sleep(2 ** attempt)
         
-        pdf_document.close()
+        uploaded_urls, stage_stats = run_page_pipeline(
+            pdf_path,
+            page_count,
+            upload_page,
+            options=RenderOptions.from_config(current_app.config),
+            render_workers=current_app.config['PDF_RENDER_WORKERS'],
+            encode_workers=current_app.config['PDF_ENCODE_WORKERS'],
+            upload_workers=current_app.config['PDF_UPLOAD_WORKERS'],
+            queue_size=current_app.config['PDF_PIPELINE_QUEUE_SIZE']
+        )
+        print(f"PDF pipeline finished for {page_count} pages: {stage_stats}")
         return uploaded_urls
 
     except Exception as e:
         print(f"PDF processing error: {e}")
         raise Exception(f"Failed to process the PDF file: {e}")
+    finally:
+        if pdf_path and os.path.exists(pdf_path):
+            os.remove(pdf_path)
 
 def extract_pdf_text(pdf_file):
     """
@@ -208,16 +201,16 @@ def extract_pdf_text(pdf_file):
     Returns:
         str: Extracted text from the PDF
     """
-    reader = PdfReader(pdf_file)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text
+    pdf_file.seek(0)
+    return pdf_text.extract(pdf_file.read())
 
 def extract_rubric_text(pdf_url):
     """
     Extract text from a PDF file at the given URL
     
+    The rubric comes from the rubric cache (shared pooled client, or the storage
+    backend for files stored by this app) and its page texts from the text cache.
+    
     Args:
         pdf_url (str): URL of the PDF file
         
@@ -225,20 +218,7 @@ def extract_rubric_text(pdf_url):
         str: Extracted text from the PDF
     """
     try:
-        session = create_session_with_retry()
-        response = session.get(pdf_url, timeout=30)
-        response.raise_for_status()
-        
-        pdf_content = response.content
-        pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        
-        text = ""
-        for page_num in range(pdf_document.page_count):
-            text += pdf_document[page_num].get_text()
-        
-        pdf_document.close()
-        return text
-        
+        return pdf_text.extract(rubric_cache.get(pdf_url))
     except Exception as e:
         print(f"Rubric extraction error: {e}")
         raise Exception(f"Failed to process rubric: {e}")
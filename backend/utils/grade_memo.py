@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+
+class MemoKey:
+    """Identity of a grading request: what was graded, against what, and how"""
+
+    def __init__(self, answer_sha256, rubric_sha256, prompt_version, model):
+        self.answer_sha256 = answer_sha256
+        self.rubric_sha256 = rubric_sha256
+        self.prompt_version = prompt_version
+        self.model = model
+
+    def filter_by(self):
+        return {
+            'answer_sha256': self.answer_sha256,
+            'rubric_sha256': self.rubric_sha256,
+            'prompt_version': self.prompt_version,
+            'model': self.model
+        }
+
+
+def make_key(answer_content, rubric_content, prompt_version, model):
+    """
+    Build the memo key for a grading request
+
+    Args:
+        answer_content (bytes): The answer sheet PDF
+        rubric_content (bytes): The rubric PDF
+        prompt_version (str): Version of the grading prompt
+        model (str): Model name
+
+    Returns:
+        MemoKey: The memo key
+    """
+    return MemoKey(
+        hashlib.sha256(answer_content).hexdigest(),
+        hashlib.sha256(rubric_content).hexdigest(),
+        prompt_version,
+        model
+    )
+
+def _enabled():
+    return has_app_context() and current_app.config['GRADE_MEMO_ENABLED']
+
+def lookup(key):
+    """
+    Get a memoized grade that has not outlived GRADE_MEMO_TTL
+
+    Args:
+        key (MemoKey): The memo key
+
+    Returns:
+        str: The memoized grade, or None
+    """
+    if not _enabled():
+        return None
+
+    from models import GradeMemo
+    from extensions import db
+
+    try:
+        memo = GradeMemo.query.filter_by(**key.filter_by()).first()
+        if memo is None:
+            return None
+
+        now = datetime.utcnow()
+        if memo.created_at < now - timedelta(seconds=current_app.config['GRADE_MEMO_TTL']):
+            db.session.delete(memo)
+            db.session.commit()
+            return None
+
+        memo.hits += 1
+        memo.last_used_at = now
+        db.session.commit()
+        return memo.grade
+    except Exception as e:
+        # The memo is an optimisation; never fail grading because of it
+        print(f"Grade memo lookup error: {e}")
+        db.session.rollback()
+        return None
+
+def store(key, grade):
+    """
+    Memoize a successful grade and evict expired or least recently used entries
+
+    Args:
+        key (MemoKey): The memo key
+        grade (str): The grade returned by the model
+    """
+    if not _enabled():
+        return
+
+    from models import GradeMemo
+    from extensions import db
+
+    try:
+        memo = GradeMemo.query.filter_by(**key.filter_by()).first()
+        now = datetime.utcnow()
+        if memo is None:
+            memo = GradeMemo(grade=grade, created_at=now, last_used_at=now, **key.filter_by())
+            db.session.add(memo)
+        else:
+            # Deliberate regrade: replace the memoized result
+            memo.grade = grade
+            memo.created_at = now
+            memo.last_used_at = now
+        db.session.commit()
+
+        evict()
+    except Exception as e:
+        print(f"Grade memo store error: {e}")
+        db.session.rollback()
+
+def evict():
+    """
+    Delete memo entries older than GRADE_MEMO_TTL, then the least recently used
+    entries beyond GRADE_MEMO_MAX_ENTRIES
+
+    Returns:
+        int: Number of entries deleted
+    """
+    from models import GradeMemo
+    from extensions import db
+
+    expired_before = datetime.utcnow() - timedelta(seconds=current_app.config['GRADE_MEMO_TTL'])
+    deleted = (GradeMemo.query
+               .filter(GradeMemo.created_at < expired_before)
+               .delete(synchronize_session=False))
+
+    # Everything at or below the last_used_at of the first entry past the limit goes
+    cutoff = (db.session.query(GradeMemo.last_used_at)
+              .order_by(GradeMemo.last_used_at.desc())
+              .offset(current_app.config['GRADE_MEMO_MAX_ENTRIES'])
+              .limit(1)
+              .scalar())
+    if cutoff is not None:
+        deleted += (GradeMemo.query
+                    .filter(GradeMemo.last_used_at <= cutoff)
+                    .delete(synchronize_session=False))
+
+    db.session.commit()
+    return deleted
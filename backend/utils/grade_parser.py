@@ -0,0 +1,72 @@
+import re
+
+# Matches the grade format requested by GRADING_PROMPT:
+#   <h3>SECTION [NAME] ([TOTAL] marks)</h3>
+#   <p><strong>Q[number] ([max_marks])</strong>: [Brief feedback] - [awarded]/[max_marks]</p>
+_TOKEN_PATTERN = re.compile(
+    r'<h3[^>]*>\s*SECTION\s+(?P<section>.*?)\s*\(\s*[\d.]+\s*marks?\s*\)\s*</h3>'
+    r'|<strong>\s*Q\s*(?P<question>[^<]+?)\s*\(\s*(?P<max>[\d.]+)\s*(?:marks?)?\s*\)\s*</strong>(?P<body>.*?)</p>',
+    re.IGNORECASE | re.DOTALL
+)
+# The awarded marks close the feedback line: "... - x/y" or "... x/y marks"
+_SCORE_PATTERN = re.compile(
+    r'(?:[-\u2013\u2014:]\s*(?P<dashed>[\d.]+)\s*/\s*[\d.]+(?:\s*marks?)?'
+    r'|(?P<marks>[\d.]+)\s*/\s*[\d.]+\s*marks?)\s*$',
+    re.IGNORECASE
+)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_grade_scores(grade_html):
+    """
+    Extract per-question scores from grade HTML
+
+    Args:
+        grade_html (str): Grade HTML in the format produced by the grading prompt
+
+    Returns:
+        list: One dict per question with 'section', 'question', 'awarded' and 'max_marks';
+            questions whose awarded marks cannot be read are skipped
+
+    Check with ``python -m doctest utils/grade_parser.py``:
+
+    >>> [s['awarded'] for s in parse_grade_scores(
+    ...     '<p><strong>Q1 (2)</strong>: Correct - 2/2</p>'
+    ...     '<p><strong>Q2 (3)</strong>: Half of 1/2 the steps - 1.5/3</p>'
+    ...     '<p><strong>Q3 (4)</strong>: Partly right 3/4 marks</p>'
+    ...     '<p><strong>Q4 (1)</strong>: Wrong <em>- 0/1</em></p>')]
+    [2.0, 1.5, 3.0, 0.0]
+    >>> parse_grade_scores('<p><strong>Q5 (1)</strong>: Answer 1/2 is wrong -</p>')
+    []
+    """
+    if not grade_html:
+        return []
+
+    scores = []
+    section = None
+    for match in _TOKEN_PATTERN.finditer(grade_html):
+        if match.group('section') is not None:
+            section = match.group('section').strip()
+            continue
+
+        body = _TAG_PATTERN.sub('', match.group('body'))
+        score = _SCORE_PATTERN.search(body)
+        if not score:
+            continue
+        awarded = _to_float(score.group('dashed') or score.group('marks'))
+        max_marks = _to_float(match.group('max'))
+        if awarded is None or max_marks is None:
+            continue
+
+        scores.append({
+            'section': section,
+            'question': match.group('question').strip(),
+            'awarded': awarded,
+            'max_marks': max_marks
+        })
+    return scores
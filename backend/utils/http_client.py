@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import threading
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class DownloadTooLargeError(Exception):
+    """Raised when a download exceeds the configured size limit"""
+
+
+class DownloadStatusError(Exception):
+    """Raised when a download returns an unexpected HTTP status"""
+
+    def __init__(self, url, status_code):
+        super().__init__(f"{url} returned status {status_code}")
+        self.url = url
+        self.status_code = status_code
+
+
+class Download:
+    """Fully read response body of a size-limited download"""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def raise_for_status(self):
+        """Raise DownloadStatusError unless the response is a 200"""
+        if self.status_code != 200:
+            raise DownloadStatusError(self.url, self.status_code)
+
+
+class AsyncHttpClient:
+    """
+    Long-lived pooled ``httpx.AsyncClient`` running on a dedicated event loop thread.
+
+    Sync callers (Flask views, grading worker threads) submit coroutines with
+    ``run_sync``; they all share the same connection pool, so keep-alive and HTTP/2
+    connections to Cloudinary are reused across submissions. The caller's context
+    variables (e.g. the exam bound for metrics) are visible to the coroutine.
+    """
+
+    def __init__(self, connect_timeout=10.0, read_timeout=60.0, max_connections=20, max_download_bytes=50 * 1024 * 1024):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_download_bytes = max_download_bytes
+        self._loop = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure timeouts and limits from the Flask app config"""
+        self.connect_timeout = app.config['HTTP_CONNECT_TIMEOUT']
+        self.read_timeout = app.config['HTTP_READ_TIMEOUT']
+        self.max_connections = app.config['HTTP_MAX_CONNECTIONS']
+        self.max_download_bytes = app.config['DOWNLOAD_MAX_BYTES']
+
+    def run_sync(self, coro):
+        """
+        Run a coroutine on the client's event loop and wait for its result
+
+        Args:
+            coro: The coroutine to run
+
+        Returns:
+            The coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), self._get_loop()).result()
+
+    def iter_sync(self, agen):
+        """
+        Iterate an async generator from a sync caller, one item at a time
+
+        Args:
+            agen: Async generator to drive on the client's event loop
+
+        Yields:
+            The generator's items
+        """
+        loop = self._get_loop()
+        context = contextvars.copy_context()
+        try:
+            while True:
+                try:
+                    yield asyncio.run_coroutine_threadsafe(_in_context(context, agen.__anext__()), loop).result()
+                except StopAsyncIteration:
+                    return
+        finally:
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
+
+    async def fetch(self, url, headers=None, max_bytes=None):
+        """
+        Download ``url``, streaming the body and aborting once it exceeds ``max_bytes``
+
+        Args:
+            url (str): URL to download
+            headers (dict, optional): Extra request headers
+            max_bytes (int, optional): Size limit, defaults to DOWNLOAD_MAX_BYTES
+
+        Returns:
+            Download: Status, headers and body of the response
+
+        Raises:
+            DownloadTooLargeError: If the body is larger than the limit
+            httpx.HTTPError: On connection errors and timeouts
+        """
+        if max_bytes is None:
+            max_bytes = self.max_download_bytes
+
+        async with self._get_client().stream('GET', url, headers=headers) as response:
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and int(declared) > max_bytes:
+                raise DownloadTooLargeError(f"{url} is {declared} bytes, limit is {max_bytes}")
+
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > max_bytes:
+                    raise DownloadTooLargeError(f"{url} exceeds the {max_bytes} byte limit")
+                chunks.append(chunk)
+
+            return Download(url, response.status_code, response.headers, b''.join(chunks))
+
+    def _get_loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(target=loop.run_forever, name="http-client-loop", daemon=True)
+                    thread.start()
+                    self._loop = loop
+        return self._loop
+
+    def _get_client(self):
+        # Only called from coroutines running on self._loop, so no locking is needed
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=True,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                )
+            )
+        return self._client
+
+
+async def _in_context(context, coro):
+    # Tasks on the loop thread start from that thread's context; copy the caller's in
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+# Process-wide client shared by every grading worker thread
+http_client = AsyncHttpClient()
@@ -0,0 +1,117 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+    multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+
+# Exam code of the work being done, so deeply nested stages (downloads, model
+# calls) can be tagged without threading the exam through every signature
+current_exam = ContextVar('current_exam', default='unknown')
+
+STAGE_DURATION = Histogram(
+    'automark_stage_duration_seconds',
+    'Duration of each stage of the upload and grading pipeline',
+    ['stage', 'exam', 'outcome'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+)
+
+PREFLIGHT_BYTES = Counter(
+    'automark_preflight_bytes',
+    'PDF bytes before and after preflight shrinking',
+    ['direction']
+)
+
+def record_stage(stage, seconds, exam=None, outcome='success'):
+    """Record an already measured stage duration"""
+    STAGE_DURATION.labels(stage, exam or current_exam.get(), outcome).observe(seconds)
+
+def record_preflight(original_bytes, output_bytes):
+    """Record the size of a PDF before and after preflight"""
+    PREFLIGHT_BYTES.labels('in').inc(original_bytes)
+    PREFLIGHT_BYTES.labels('out').inc(output_bytes)
+
+@contextmanager
+def observe_stage(stage, exam=None):
+    """
+    Time a pipeline stage into the stage duration histogram
+
+    Args:
+        stage (str): Stage name, e.g. 'upload' or 'model'
+        exam (str, optional): Exam code, defaults to the exam bound with ``bind_exam``
+
+    The outcome label is 'error' if the block raises, 'success' otherwise.
+    """
+    start = time.perf_counter()
+    outcome = 'success'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        record_stage(stage, time.perf_counter() - start, exam, outcome)
+
+@contextmanager
+def bind_exam(exam_code):
+    """Tag every stage observed inside the block with ``exam_code``"""
+    token = current_exam.set(exam_code or 'unknown')
+    try:
+        yield
+    finally:
+        current_exam.reset(token)
+
+
+class GradingStateCollector:
+    """Exports the Gemini limiter and rubric cache state at scrape time"""
+
+    def collect(self):
+        from utils.rate_limiter import gemini_limiter
+        from utils.rubric_cache import rubric_cache
+
+        limiter = gemini_limiter.stats()
+        for name in ('concurrency_limit', 'in_flight', 'requests_available', 'tokens_available'):
+            gauge = GaugeMetricFamily(f'automark_gemini_limiter_{name}', f'Gemini limiter {name.replace("_", " ")}')
+            gauge.add_metric([], limiter[name])
+            yield gauge
+        for name in ('calls', 'successes', 'throttled', 'retries', 'failures'):
+            counter = CounterMetricFamily(f'automark_gemini_{name}', f'Gemini calls: {name}')
+            counter.add_metric([], limiter[name])
+            yield counter
+
+        cache = rubric_cache.stats()
+        lookups = CounterMetricFamily('automark_rubric_cache_lookups', 'Rubric cache lookups by result', labels=['result'])
+        for result in ('memory_hits', 'disk_hits', 'revalidated', 'misses'):
+            lookups.add_metric([result], cache[result])
+        yield lookups
+        memory = GaugeMetricFamily('automark_rubric_cache_memory_bytes', 'Bytes held by the in-memory rubric cache')
+        memory.add_metric([], cache['memory_bytes'])
+        yield memory
+
+
+REGISTRY.register(GradingStateCollector())
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format
+
+    When PROMETHEUS_MULTIPROC_DIR is set (several gunicorn workers), histograms are
+    aggregated across processes; the limiter and cache state are per process.
+
+    Returns:
+        tuple: (body, content_type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(GradingStateCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
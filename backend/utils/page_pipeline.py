@@ -0,0 +1,168 @@
+import time
+import threading
+from queue import Queue, Empty
+from utils.pdf_render import get_render_pool, render_page, encode_jpeg
+from utils.metrics import record_stage
+
+# Marks the end of a stage's input
+_DONE = object()
+
+class PipelineStats:
+    """Per-stage page counts, busy time and bytes produced"""
+
+    def __init__(self, stages):
+        self._lock = threading.Lock()
+        self._stages = {stage: {'pages': 0, 'busy_seconds': 0.0, 'bytes': 0} for stage in stages}
+
+    def record(self, stage, seconds, nbytes):
+        with self._lock:
+            entry = self._stages[stage]
+            entry['pages'] += 1
+            entry['busy_seconds'] += seconds
+            entry['bytes'] += nbytes
+        record_stage(f"page_{stage}", seconds)
+
+    def summary(self, wall_seconds):
+        """
+        Summarise throughput per stage
+
+        Args:
+            wall_seconds (float): Total duration of the pipeline
+
+        Returns:
+            dict: For each stage, pages, busy seconds, bytes and pages/MB per wall-clock second
+        """
+        with self._lock:
+            return {
+                stage: {
+                    **entry,
+                    'busy_seconds': round(entry['busy_seconds'], 3),
+                    'ms_per_page': round(entry['busy_seconds'] * 1000 / entry['pages'], 1) if entry['pages'] else None,
+                    'pages_per_second': round(entry['pages'] / wall_seconds, 2) if wall_seconds else None,
+                    'mb_per_second': round(entry['bytes'] / wall_seconds / 1e6, 2) if wall_seconds else None
+                }
+                for stage, entry in self._stages.items()
+            }
+
+
+def run_page_pipeline(pdf_path, page_count, upload, options, render_workers, encode_workers, upload_workers, queue_size):
+    """
+    Render, encode and upload PDF pages as three overlapping stages
+
+    Rendering runs on the shared process pool, encoding and uploading on their own
+    threads. Stages are connected by bounded queues, so at most ``queue_size`` raw
+    frames and ``queue_size`` encoded images wait between stages: a slow upload
+    stalls rendering instead of letting memory grow with the page count.
+
+    Args:
+        pdf_path (str): Path of the PDF on local disk
+        page_count (int): Number of pages to process
+        upload (callable): upload(page_num, jpeg_bytes) -> URL; may block and retry
+        options (RenderOptions): Rendering and encoding options; in direct mode pages
+            arrive already encoded and the encode stage only forwards them
+        render_workers (int): Pages rendered at once
+        encode_workers (int): Pages encoded at once
+        upload_workers (int): Pages uploaded at once
+        queue_size (int): Capacity of each queue between stages
+
+    Returns:
+        tuple: (URLs in page order, per-stage throughput summary)
+
+    Raises:
+        Exception: The first error raised by any stage
+    """
+    pages = Queue()
+    for page_num in range(page_count):
+        pages.put(page_num)
+    frames = Queue(maxsize=queue_size)
+    images = Queue(maxsize=queue_size)
+
+    urls = [None] * page_count
+    errors = []
+    failed = threading.Event()
+    stats = PipelineStats(['render', 'encode', 'upload'])
+    pool = get_render_pool(render_workers)
+
+    def fail(error):
+        errors.append(error)
+        failed.set()
+
+    def render_stage():
+        while not failed.is_set():
+            try:
+                page_num = pages.get_nowait()
+            except Empty:
+                return
+            try:
+                start = time.perf_counter()
+                frame = pool.submit(render_page, pdf_path, page_num, options).result()
+                elapsed = time.perf_counter() - start
+                produced = frame['jpeg'] if 'jpeg' in frame else frame['samples']
+                stats.record('render', elapsed - frame['encode_seconds'], len(produced))
+                frames.put((page_num, frame))
+            except Exception as e:
+                fail(e)
+
+    def encode_stage():
+        while True:
+            item = frames.get()
+            if item is _DONE:
+                return
+            if failed.is_set():
+                continue  # Keep draining so producers never block
+            page_num, frame = item
+            try:
+                if 'jpeg' in frame:
+                    # Encoded in the render worker straight from the pixmap
+                    jpeg = frame['jpeg']
+                    stats.record('encode', frame['encode_seconds'], len(jpeg))
+                else:
+                    start = time.perf_counter()
+                    jpeg = encode_jpeg(frame['width'], frame['height'], frame['samples'],
+                                       frame['mode'], options.quality)
+                    stats.record('encode', time.perf_counter() - start, len(jpeg))
+                images.put((page_num, jpeg))
+            except Exception as e:
+                fail(e)
+
+    def upload_stage():
+        while True:
+            item = images.get()
+            if item is _DONE:
+                return
+            if failed.is_set():
+                continue
+            page_num, jpeg = item
+            try:
+                start = time.perf_counter()
+                urls[page_num] = upload(page_num, jpeg)
+                stats.record('upload', time.perf_counter() - start, len(jpeg))
+            except Exception as e:
+                fail(e)
+
+    def start_threads(target, count, name):
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True) for i in range(max(count, 1))]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    wall_start = time.perf_counter()
+    renderers = start_threads(render_stage, render_workers, "page-render")
+    encoders = start_threads(encode_stage, encode_workers, "page-encode")
+    uploaders = start_threads(upload_stage, upload_workers, "page-upload")
+
+    # Shut the stages down in order, once each one's producers have finished
+    for thread in renderers:
+        thread.join()
+    for _ in encoders:
+        frames.put(_DONE)
+    for thread in encoders:
+        thread.join()
+    for _ in uploaders:
+        images.put(_DONE)
+    for thread in uploaders:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return urls, stats.summary(time.perf_counter() - wall_start)
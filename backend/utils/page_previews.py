@@ -0,0 +1,159 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import Future
+import fitz  # PyMuPDF
+from utils.http_client import http_client
+from utils.storage import storage
+from utils.atomic_file import atomic_write
+
+class PagePreviewCache:
+    """
+    On-demand JPEG previews of single PDF pages, cached on disk.
+
+    Previews are keyed by (document id, page, width); the document id is the PDF's
+    SHA-256 when known, so a cache hit never needs the PDF itself. The cache
+    directory is the only index, so every process serving previews shares it: hits
+    touch the file's mtime, and after each render the least recently used files are
+    removed until the directory fits in ``max_bytes``. Concurrent requests for the
+    same preview within a process share one render (single flight).
+    """
+
+    def __init__(self, cache_dir='cache/previews', max_bytes=512 * 1024 * 1024, max_width=1600,
+                 width_step=100, jpeg_quality=80):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.width_step = width_step
+        self.jpeg_quality = jpeg_quality
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the cache from the Flask app config"""
+        self.cache_dir = app.config['PREVIEW_CACHE_DIR']
+        self.max_bytes = app.config['PREVIEW_CACHE_MAX_BYTES']
+        self.max_width = app.config['PREVIEW_MAX_WIDTH']
+        self.width_step = app.config['PREVIEW_WIDTH_STEP']
+        self.jpeg_quality = app.config['PREVIEW_JPEG_QUALITY']
+
+    def normalize_width(self, width):
+        """Round a requested width up to a multiple of the width step, within limits"""
+        width = max(self.width_step, min(int(width), self.max_width))
+        return -(-width // self.width_step) * self.width_step
+
+    def get(self, url, page_num, width, document_id=None):
+        """
+        Get the path of a page preview, rendering it if needed
+
+        Args:
+            url (str): URL of the PDF, read from storage when the app stored it
+            page_num (int): Zero-based page number
+            width (int): Requested width in pixels (see ``normalize_width``)
+            document_id (str, optional): SHA-256 of the PDF, defaults to a hash of the URL
+
+        Returns:
+            str: Path of the cached JPEG
+
+        Raises:
+            IndexError: If the page does not exist
+        """
+        width = self.normalize_width(width)
+        document_id = document_id or hashlib.sha256(url.encode('utf-8')).hexdigest()
+        name = f"{document_id}-p{page_num}-w{width}.jpg"
+        path = os.path.join(self.cache_dir, name)
+
+        try:
+            # Another process may have evicted it; then it is rendered again below
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            future = self._in_flight.get(name)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[name] = future
+
+        if not owner:
+            # Someone else is rendering this preview; wait for their result
+            return future.result()
+
+        try:
+            image = _render(_load_pdf(url), page_num, width, self.jpeg_quality)
+            atomic_write(path, image)
+            self._evict(keep=name)
+            future.set_result(path)
+            return path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(name, None)
+
+    def stats(self):
+        """
+        Get the cache size
+
+        Returns:
+            dict: Number of cached previews and their total bytes
+        """
+        files = self._scan()
+        return {'entries': len(files), 'bytes': sum(size for _, _, size in files)}
+
+    def _scan(self):
+        # (mtime, name, size) of every cached preview, least recently used first
+        files = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return files
+        for name in names:
+            if not name.endswith('.jpg'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile
+            files.append((stat.st_mtime, name, stat.st_size))
+        files.sort()
+        return files
+
+    def _evict(self, keep):
+        files = self._scan()
+        total = sum(size for _, _, size in files)
+        for _, name, size in files:
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _load_pdf(url):
+    key = storage.key_from_url(url)
+    if key is not None:
+        return storage.read(key)
+    response = http_client.run_sync(http_client.fetch(url))
+    response.raise_for_status()
+    return response.content
+
+def _render(content, page_num, width, quality):
+    with fitz.open(stream=content, filetype="pdf") as pdf_document:
+        if not 0 <= page_num < pdf_document.page_count:
+            raise IndexError(f"Page {page_num + 1} does not exist, the document has {pdf_document.page_count} pages")
+        page = pdf_document[page_num]
+        zoom = width / page.rect.width
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return pix.tobytes(output="jpeg", jpg_quality=quality)
+
+
+# Process-wide preview cache shared by request handlers
+page_previews = PagePreviewCache()
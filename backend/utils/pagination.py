@@ -0,0 +1,102 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+def encode_cursor(submitted_at, row_id):
+    """
+    Encode the position after a row as an opaque cursor
+
+    Args:
+        submitted_at (datetime): The row's timestamp
+        row_id (int): The row's ID, breaking ties between equal timestamps
+
+    Returns:
+        str: URL-safe cursor
+    """
+    raw = f"{submitted_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by ``encode_cursor``
+
+    Args:
+        cursor (str): The cursor
+
+    Returns:
+        tuple: (submitted_at, id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        submitted_at, row_id = raw.split('|')
+        return datetime.fromisoformat(submitted_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_page(query, time_column, id_column, cursor=None, limit=None):
+    """
+    Fetch one page of a query ordered newest first by (time_column, id_column)
+
+    Rows after the cursor are found with a row-value comparison, so each page is an
+    index range read no matter how deep into the history it is.
+
+    Args:
+        query: Query already ordered by ``time_column.desc(), id_column.desc()``
+        time_column: Timestamp column, e.g. Submission.submitted_at
+        id_column: Primary key column
+        cursor (tuple, optional): Decoded cursor of the previous page's last row
+        limit (int, optional): Page size; None returns every remaining row
+
+    Returns:
+        tuple: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    if cursor is not None:
+        query = query.filter(tuple_(time_column, id_column) < tuple_(*cursor))
+    if limit is None:
+        return query.all(), None
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+
+def parse_fields(value, available, default):
+    """
+    Parse a sparse fieldset parameter such as ``?fields=id,status,grade``
+
+    Args:
+        value (str): Comma-separated field names, or None/empty for the default
+        available (iterable): Names the listing can return
+        default (tuple): Fields returned when none are requested
+
+    Returns:
+        tuple: Field names, in the requested order
+
+    Raises:
+        ValueError: If a field is unknown
+    """
+    if not value:
+        return tuple(default)
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; available: {', '.join(available)}")
+    return fields
+
+def listing_columns(fields, required=('id', 'submitted_at')):
+    """Columns a listing selects: the requested fields plus those paging and formatting need"""
+    return tuple(dict.fromkeys(tuple(required) + tuple(fields)))
+
+def format_listing_row(row, fields):
+    """Serialize the requested fields of a listing row for the API response"""
+    formatted = {}
+    for name in fields:
+        value = getattr(row, name)
+        formatted[name] = value.isoformat() if name == 'submitted_at' and value else value
+    return formatted
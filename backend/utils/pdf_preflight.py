@@ -0,0 +1,146 @@
+import os
+import time
+import hashlib
+import fitz  # PyMuPDF
+from utils.metrics import record_stage, record_preflight
+from utils.atomic_file import atomic_write
+
+class PreflightError(Exception):
+    """Raised when a PDF cannot be sent for grading"""
+
+
+class PdfPreflight:
+    """
+    Checks PDFs before they are sent to the model and shrinks oversized ones.
+
+    Documents over ``max_pages`` are rejected. Documents over ``target_bytes`` get
+    their embedded images downsampled to ``image_dpi`` (then progressively lower,
+    down to ``min_image_dpi``) and re-encoded as JPEG, and unused objects are
+    garbage collected. The shrunk grading copy is cached on disk by the original's
+    SHA-256, so each document is only processed once.
+    """
+
+    def __init__(self, enabled=True, max_pages=100, target_bytes=8 * 1024 * 1024, image_dpi=150,
+                 min_image_dpi=96, jpeg_quality=75, cache_dir='cache/preflight'):
+        self.enabled = enabled
+        self.max_pages = max_pages
+        self.target_bytes = target_bytes
+        self.image_dpi = image_dpi
+        self.min_image_dpi = min_image_dpi
+        self.jpeg_quality = jpeg_quality
+        self.cache_dir = cache_dir
+
+    def init_app(self, app):
+        """Configure limits from the Flask app config"""
+        self.enabled = app.config['PDF_PREFLIGHT_ENABLED']
+        self.max_pages = app.config['PDF_MAX_PAGES']
+        self.target_bytes = app.config['PDF_PREFLIGHT_TARGET_BYTES']
+        self.image_dpi = app.config['PDF_PREFLIGHT_IMAGE_DPI']
+        self.min_image_dpi = app.config['PDF_PREFLIGHT_MIN_IMAGE_DPI']
+        self.jpeg_quality = app.config['PDF_PREFLIGHT_JPEG_QUALITY']
+        self.cache_dir = app.config['PDF_PREFLIGHT_CACHE_DIR']
+
+    def prepare(self, content, label='document'):
+        """
+        Get the copy of a PDF to send for grading
+
+        Args:
+            content (bytes): The original PDF
+            label (str): Name used in logs, e.g. 'answer sheet'
+
+        Returns:
+            bytes: The original if it is within the size target, otherwise a smaller copy
+                (or the original when it cannot be shrunk)
+
+        Raises:
+            PreflightError: If the PDF cannot be opened or has too many pages
+        """
+        start = time.perf_counter()
+        try:
+            with fitz.open(stream=content, filetype="pdf") as pdf_document:
+                page_count = pdf_document.page_count
+        except Exception as e:
+            raise PreflightError(f"{label} is not a readable PDF ({e})") from e
+
+        if page_count > self.max_pages:
+            raise PreflightError(f"{label} has {page_count} pages, the limit is {self.max_pages}")
+
+        if not self.enabled or len(content) <= self.target_bytes:
+            return content
+
+        cache_path = self._cache_path(content)
+        try:
+            with open(cache_path, 'rb') as f:
+                return f.read()
+        except OSError:
+            pass
+
+        shrunk = self._shrink(content)
+        seconds = time.perf_counter() - start
+        record_stage('preflight', seconds)
+        record_preflight(len(content), len(shrunk))
+        print(f"Preflight shrank {label} from {len(content)} to {len(shrunk)} bytes in {seconds * 1000:.0f} ms")
+
+        if len(shrunk) < len(content):
+            try:
+                atomic_write(cache_path, shrunk)
+            except OSError as e:
+                print(f"Preflight cache write error: {e}")
+        return shrunk
+
+    def _shrink(self, content):
+        best = content
+        dpi = self.image_dpi
+        while True:
+            try:
+                candidate = self._rewrite(content, dpi)
+            except Exception as e:
+                # A damaged or unusual file is still better sent as is
+                print(f"Preflight could not rewrite PDF: {e}")
+                return best
+
+            if len(candidate) < len(best):
+                best = candidate
+            if len(best) <= self.target_bytes or dpi <= self.min_image_dpi:
+                return best
+            dpi = max(self.min_image_dpi, int(dpi * 0.75))
+
+    def _rewrite(self, content, dpi):
+        with fitz.open(stream=content, filetype="pdf") as pdf_document:
+            done = set()
+            for page in pdf_document:
+                for info in page.get_image_info(xrefs=True):
+                    xref = info.get('xref')
+                    if not xref or xref in done:
+                        continue
+                    done.add(xref)
+                    self._downsample(page, xref, info, dpi)
+
+            # garbage=4 drops unused and duplicate objects; deflate recompresses streams
+            return pdf_document.tobytes(garbage=4, deflate=True, clean=True)
+
+    def _downsample(self, page, xref, info, dpi):
+        x0, y0, x1, y1 = info['bbox']
+        shown_width = abs(x1 - x0) / 72  # inches on the page
+        if shown_width <= 0 or info['width'] / shown_width <= dpi:
+            return
+
+        pix = fitz.Pixmap(page.parent, xref)
+        if pix.alpha:
+            # Soft masks would need rewriting as well; leave transparent images alone
+            return
+        if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+
+        scale = dpi * shown_width / pix.width
+        resized = fitz.Pixmap(pix, max(1, int(pix.width * scale)), max(1, int(pix.height * scale)), None)
+        page.replace_image(xref, stream=resized.tobytes(output="jpeg", jpg_quality=self.jpeg_quality))
+
+    def _cache_path(self, content):
+        settings = f"{self.target_bytes}:{self.image_dpi}:{self.min_image_dpi}:{self.jpeg_quality}"
+        tag = hashlib.sha256(settings.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(content).hexdigest()}-{tag}.pdf")
+
+
+# Process-wide preflight shared by every grading worker thread
+pdf_preflight = PdfPreflight()
@@ -0,0 +1,136 @@
+import io
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz  # PyMuPDF
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_render_pool(workers):
+    """
+    Get the process pool used for page rendering, creating it on first use
+
+    The pool is reused across documents so worker start-up is paid once per process.
+    It is sized by the first caller (PDF_RENDER_WORKERS) and never resized, since
+    shutting it down would break renders still running on it. Workers are started
+    from a fork server (spawned where that is unavailable) rather than forked from
+    a parent that has threads, locks and database connections in use. The fork
+    server preloads this module rather than ``__main__``; workers still re-import
+    ``__main__`` as ``__mp_main__``, which app.py skips building the app for.
+
+    Args:
+        workers (int): Number of worker processes, used when the pool is created
+
+    Returns:
+        ProcessPoolExecutor: The shared pool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pool
+
+class RenderOptions:
+    """How pages are rasterized and encoded (picklable, sent to pool workers)"""
+
+    def __init__(self, dpi=300, grayscale=False, direct=False, quality=95, byte_budget=None, min_dpi=100):
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.direct = direct
+        self.quality = quality
+        self.byte_budget = byte_budget
+        self.min_dpi = min_dpi
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            dpi=config['PDF_RENDER_DPI'],
+            grayscale=config['PDF_RENDER_GRAYSCALE'],
+            direct=config['PDF_IMAGE_ENCODING'] == 'direct',
+            quality=config['PDF_JPEG_QUALITY'],
+            byte_budget=config['PDF_PAGE_BYTE_BUDGET'],
+            min_dpi=config['PDF_MIN_DPI']
+        )
+
+
+# Qualities tried, in order, when a page overshoots its byte budget
+_BUDGET_QUALITIES = (85, 75, 60, 45)
+
+def render_page(pdf_path, page_num, options):
+    """
+    Render a single PDF page
+
+    Runs inside a pool worker: each worker opens the PDF itself, since PyMuPDF
+    documents cannot be shared between processes.
+
+    In direct mode the page is encoded to JPEG straight from the PyMuPDF pixmap,
+    with no PIL round trip and no copy of the raw pixels back to the parent
+    process. With a byte budget, quality and then resolution are lowered until the
+    page fits.
+
+    Args:
+        pdf_path (str): Path of the PDF on local disk
+        page_num (int): Zero-based page number
+        options (RenderOptions): Rendering and encoding options
+
+    Returns:
+        dict: 'jpeg' bytes in direct mode, otherwise raw 'width', 'height', 'mode'
+            and 'samples'; plus 'encode_seconds' spent encoding in the worker
+    """
+    colorspace = fitz.csGRAY if options.grayscale else fitz.csRGB
+    with fitz.open(pdf_path) as pdf_document:
+        page = pdf_document[page_num]
+        dpi = options.dpi
+        while True:
+            zoom = dpi / 72
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace, alpha=False)
+
+            if not options.direct:
+                return {
+                    'width': pix.width,
+                    'height': pix.height,
+                    'mode': 'L' if pix.n == 1 else 'RGB',
+                    'samples': pix.samples,
+                    'encode_seconds': 0.0
+                }
+
+            start = time.perf_counter()
+            qualities = (options.quality,) + tuple(q for q in _BUDGET_QUALITIES if q < options.quality)
+            for quality in qualities:
+                jpeg = pix.tobytes(output="jpeg", jpg_quality=quality)
+                if not options.byte_budget or len(jpeg) <= options.byte_budget:
+                    break
+            encode_seconds = time.perf_counter() - start
+
+            fits = not options.byte_budget or len(jpeg) <= options.byte_budget
+            if fits or dpi <= options.min_dpi:
+                return {'jpeg': jpeg, 'encode_seconds': encode_seconds}
+            dpi = max(options.min_dpi, int(dpi * 0.75))
+
+def encode_jpeg(width, height, samples, mode='RGB', quality=95):
+    """
+    Encode raw pixels as JPEG with PIL
+
+    Args:
+        width (int): Image width
+        height (int): Image height
+        samples (bytes): Pixel data
+        mode (str): 'RGB' or 'L' (grayscale)
+        quality (int): JPEG quality
+
+    Returns:
+        bytes: The JPEG image
+    """
+    from PIL import Image
+
+    img_data = Image.frombytes(mode, [width, height], samples)
+    img_byte_array = io.BytesIO()
+    img_data.save(img_byte_array, format='JPEG', quality=quality)
+    return img_byte_array.getvalue()
@@ -0,0 +1,152 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+import fitz  # PyMuPDF
+from utils.pdf_render import get_render_pool
+
+def extract_page_range(pdf_path, start, stop):
+    """
+    Extract the text of pages ``start`` to ``stop - 1``
+
+    Runs inside a pool worker, which opens the PDF itself.
+
+    Args:
+        pdf_path (str): Path of the PDF on local disk
+        start (int): First zero-based page number
+        stop (int): Page number to stop before
+
+    Returns:
+        list: Text of each page
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        return [pdf_document[page_num].get_text() for page_num in range(start, stop)]
+
+
+class PdfTextExtractor:
+    """
+    PyMuPDF text extraction with a per-page cache.
+
+    Page texts are cached in memory by (content SHA-256, page number) in an LRU
+    bounded by total characters, so the same rubric or answer sheet is only parsed
+    once. Documents with at least ``parallel_min_pages`` uncached pages are split
+    into page ranges extracted on the shared render process pool.
+    """
+
+    def __init__(self, max_cache_chars=32 * 1024 * 1024, workers=4, parallel_min_pages=16):
+        self.max_cache_chars = max_cache_chars
+        self.workers = workers
+        self.parallel_min_pages = parallel_min_pages
+        self._cache = OrderedDict()
+        self._cache_chars = 0
+        self._lock = threading.Lock()
+        self._counters = {'page_hits': 0, 'page_misses': 0}
+
+    def init_app(self, app):
+        """Configure the cache and parallelism from the Flask app config"""
+        self.max_cache_chars = app.config['PDF_TEXT_CACHE_CHARS']
+        self.workers = app.config['PDF_RENDER_WORKERS']
+        self.parallel_min_pages = app.config['PDF_TEXT_PARALLEL_MIN_PAGES']
+
+    def extract(self, content):
+        """
+        Extract the text of a PDF
+
+        Args:
+            content (bytes): The PDF
+
+        Returns:
+            str: Text of every page, in order
+        """
+        return "".join(self.extract_pages(content))
+
+    def extract_pages(self, content):
+        """
+        Extract the text of each page of a PDF
+
+        Args:
+            content (bytes): The PDF
+
+        Returns:
+            list: Text of each page, in order
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        with fitz.open(stream=content, filetype="pdf") as pdf_document:
+            page_count = pdf_document.page_count
+            texts = [self._cache_get(sha256, page_num) for page_num in range(page_count)]
+            missing = [page_num for page_num, text in enumerate(texts) if text is None]
+
+            self._count('page_hits', page_count - len(missing))
+            self._count('page_misses', len(missing))
+            if not missing:
+                return texts
+
+            if len(missing) < self.parallel_min_pages or self.workers < 2:
+                for page_num in missing:
+                    texts[page_num] = pdf_document[page_num].get_text()
+            else:
+                self._extract_parallel(content, missing[0], missing[-1] + 1, texts)
+
+        for page_num in missing:
+            self._cache_put(sha256, page_num, texts[page_num])
+        return texts
+
+    def stats(self):
+        """
+        Get the cache counters
+
+        Returns:
+            dict: Page hit/miss counters and cache size
+        """
+        with self._lock:
+            return {**self._counters, 'cached_pages': len(self._cache), 'cached_chars': self._cache_chars}
+
+    def _extract_parallel(self, content, first, stop, texts):
+        # Workers open the document from disk rather than receiving its bytes
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp:
+            tmp.write(content)
+            pdf_path = tmp.name
+        try:
+            pool = get_render_pool(self.workers)
+            span = -(-(stop - first) // self.workers)
+            futures = [
+                (start, pool.submit(extract_page_range, pdf_path, start, min(start + span, stop)))
+                for start in range(first, stop, span)
+            ]
+            for start, future in futures:
+                for offset, text in enumerate(future.result()):
+                    texts[start + offset] = text
+        finally:
+            os.remove(pdf_path)
+
+    def _count(self, name, amount):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _cache_get(self, sha256, page_num):
+        with self._lock:
+            text = self._cache.get((sha256, page_num))
+            if text is not None:
+                self._cache.move_to_end((sha256, page_num))
+            return text
+
+    def _cache_put(self, sha256, page_num, text):
+        if len(text) > self.max_cache_chars:
+            return
+
+        with self._lock:
+            previous = self._cache.pop((sha256, page_num), None)
+            if previous is not None:
+                self._cache_chars -= len(previous)
+
+            self._cache[(sha256, page_num)] = text
+            self._cache_chars += len(text)
+
+            while self._cache_chars > self.max_cache_chars:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_chars -= len(evicted)
+
+
+# Process-wide extractor shared by request handlers and grading workers
+pdf_text = PdfTextExtractor()
@@ -0,0 +1,100 @@
+import re
+from contextlib import contextmanager
+from sqlalchemy import event, text
+
+def explain(session, query):
+    """
+    Get the database's plan for a query
+
+    Bound parameters are inlined, so only use this with trusted sample values.
+
+    Args:
+        session: SQLAlchemy session
+        query: ORM query or select statement
+
+    Returns:
+        list: Plan lines, e.g. 'SEARCH submission USING INDEX ...' on SQLite
+
+    Raises:
+        ValueError: If the database is neither SQLite nor PostgreSQL
+    """
+    statement = getattr(query, 'statement', query)
+    dialect = session.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    if dialect.name == 'postgresql':
+        # Small tables make sequential scans the cheapest choice; rule them out so a
+        # plan only keeps one when no index can serve the query
+        session.execute(text("SET LOCAL enable_seqscan = off"))
+        try:
+            return [row[0] for row in session.execute(text(f"EXPLAIN {sql}"))]
+        finally:
+            session.rollback()
+    raise ValueError(f"Query plans are not supported on {dialect.name}")
+
+def full_scans(plan, table):
+    """
+    Find the plan lines that read every row of a table
+
+    Args:
+        plan (list): Lines returned by ``explain``
+        table (str): Table name
+
+    Returns:
+        list: Offending plan lines (empty if the table is only searched by index)
+    """
+    patterns = [
+        # SQLite: SEARCH is an index lookup, SCAN (even USING INDEX) reads it all
+        re.compile(rf'^SCAN (TABLE )?{re.escape(table)}\b'),
+        # PostgreSQL
+        re.compile(rf'Seq Scan on {re.escape(table)}\b'),
+    ]
+    return [line for line in plan if any(pattern.search(line.strip()) for pattern in patterns)]
+
+def sorts(plan):
+    """
+    Find the plan lines that sort rows instead of reading them in index order
+
+    Args:
+        plan (list): Lines returned by ``explain``
+
+    Returns:
+        list: Offending plan lines (empty if an index supplies the order)
+    """
+    patterns = [
+        # SQLite, including partial sorts ("RIGHT PART OF ORDER BY")
+        re.compile(r'^USE TEMP B-TREE FOR .*ORDER BY'),
+        # PostgreSQL
+        re.compile(r'^(->\s*)?(Incremental )?Sort\s+\('),
+    ]
+    return [line for line in plan if any(pattern.search(line.strip()) for pattern in patterns)]
+
+class QueryCounter:
+    """Number of statements executed inside a ``count_queries`` block"""
+
+    def __init__(self):
+        self.count = 0
+
+@contextmanager
+def count_queries(engine):
+    """
+    Count the SQL statements an engine executes inside the block
+
+    Args:
+        engine: SQLAlchemy engine
+
+    Yields:
+        QueryCounter: Its ``count`` is updated as statements run
+    """
+    counter = QueryCounter()
+
+    def before_cursor_execute(*args):
+        counter.count += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
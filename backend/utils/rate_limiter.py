@@ -0,0 +1,250 @@
+import time
+import random
+import asyncio
+import httpx
+from google.genai import errors as genai_errors
+
+# HTTP statuses worth retrying: quota bursts and transient server failures
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute`` tokens per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until ``amount`` tokens are available (0 if they are now)"""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def available(self):
+        """Current level without mutating the bucket (safe to call from other threads)"""
+        return min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+
+def is_retryable(error):
+    """
+    Check whether a failed model call is worth retrying
+
+    Args:
+        error (Exception): The exception raised by the call
+
+    Returns:
+        bool: True for rate limiting, server errors and network timeouts
+    """
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+class GeminiLimiter:
+    """
+    Process-wide limiter for Gemini calls.
+
+    Combines a requests-per-minute and a tokens-per-minute token bucket with an
+    AIMD concurrency limit: every success raises the limit by 1/limit, every
+    throttling response halves it. Retryable failures are retried with full-jitter
+    exponential backoff. All state lives on the shared HTTP client's event loop,
+    so the asyncio primitives here are shared by every grading worker thread.
+    """
+
+    def __init__(self, requests_per_minute=1000, tokens_per_minute=4000000, min_concurrency=1,
+                 max_concurrency=16, max_retries=5, retry_base_delay=1.0, retry_max_delay=30.0,
+                 token_estimate=10000):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.token_estimate = token_estimate
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._condition = None
+        self._counters = {'calls': 0, 'successes': 0, 'throttled': 0, 'retries': 0, 'failures': 0}
+
+    def init_app(self, app):
+        """Configure limits from the Flask app config"""
+        self.min_concurrency = app.config['GEMINI_MIN_CONCURRENCY']
+        self.max_concurrency = app.config['GEMINI_MAX_CONCURRENCY']
+        self.max_retries = app.config['GEMINI_MAX_RETRIES']
+        self.retry_base_delay = app.config['GEMINI_RETRY_BASE_DELAY']
+        self.retry_max_delay = app.config['GEMINI_RETRY_MAX_DELAY']
+        self.token_estimate = app.config['GRADING_TOKEN_ESTIMATE']
+        self.requests = TokenBucket(app.config['GEMINI_REQUESTS_PER_MINUTE'])
+        self.tokens = TokenBucket(app.config['GEMINI_TOKENS_PER_MINUTE'])
+        self.concurrency_limit = float(self.max_concurrency)
+
+    async def call(self, make_call, estimated_tokens=None):
+        """
+        Run a model call under the rate and concurrency limits, retrying transient errors
+
+        Args:
+            make_call (callable): Returns a new awaitable for each attempt
+            estimated_tokens (int, optional): Tokens reserved from the tokens-per-minute
+                bucket, defaults to GRADING_TOKEN_ESTIMATE; corrected with the response's
+                usage metadata when available
+
+        Returns:
+            The model response
+
+        Raises:
+            Exception: The last error once retries are exhausted, or any non-retryable error
+        """
+        if estimated_tokens is None:
+            estimated_tokens = self.token_estimate
+
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens)
+            self._counters['calls'] += 1
+            try:
+                response = await make_call()
+            except Exception as e:
+                self._release()
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    self._counters['failures'] += 1
+                    raise
+
+                if isinstance(e, genai_errors.APIError) and e.code == 429:
+                    self._on_throttled()
+                attempt += 1
+                self._counters['retries'] += 1
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                print(f"Retryable Gemini error ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self._release()
+            self._on_success(response, estimated_tokens)
+            return response
+
+    async def stream(self, open_stream, estimated_tokens=None):
+        """
+        Streaming variant of ``call``: yields chunks from a streaming model call
+
+        Retryable errors are only retried before the first chunk has been yielded;
+        once output has reached the caller the error is raised instead.
+
+        Args:
+            open_stream (callable): Returns a new awaitable resolving to an async iterator
+            estimated_tokens (int, optional): Tokens reserved from the tokens-per-minute bucket
+
+        Yields:
+            Response chunks
+        """
+        if estimated_tokens is None:
+            estimated_tokens = self.token_estimate
+
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens)
+            self._counters['calls'] += 1
+            last_chunk = None
+            try:
+                async for chunk in await open_stream():
+                    last_chunk = chunk
+                    yield chunk
+            except Exception as e:
+                self._release()
+                if last_chunk is not None or not is_retryable(e) or attempt >= self.max_retries:
+                    self._counters['failures'] += 1
+                    raise
+
+                if isinstance(e, genai_errors.APIError) and e.code == 429:
+                    self._on_throttled()
+                attempt += 1
+                self._counters['retries'] += 1
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                print(f"Retryable Gemini error ({e}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Consumer went away mid-stream
+                self._release()
+                raise
+
+            self._release()
+            self._on_success(last_chunk, estimated_tokens)
+            return
+
+    def stats(self):
+        """
+        Get the current limiter state
+
+        Returns:
+            dict: Concurrency limit, in-flight calls, bucket levels and counters
+        """
+        return {
+            'concurrency_limit': round(self.concurrency_limit, 2),
+            'in_flight': self.in_flight,
+            'requests_available': round(self.requests.available(), 2),
+            'tokens_available': round(self.tokens.available(), 2),
+            **self._counters
+        }
+
+    async def _acquire(self, estimated_tokens):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < max(int(self.concurrency_limit), 1))
+            self.in_flight += 1
+
+        # No await between checking and taking, so this is atomic on the event loop
+        try:
+            while True:
+                self.requests.refill()
+                self.tokens.refill()
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                if wait == 0:
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    return
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        asyncio.ensure_future(self._notify())
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    def _on_success(self, response, estimated_tokens):
+        self._counters['successes'] += 1
+        # Additive increase: roughly +1 per window of `limit` successful calls
+        self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1.0 / self.concurrency_limit)
+
+        usage = getattr(response, 'usage_metadata', None)
+        actual = getattr(usage, 'total_token_count', None) if usage else None
+        if actual:
+            # Settle the reservation against what the call really used
+            self.tokens.take(actual - estimated_tokens)
+
+    def _on_throttled(self):
+        self._counters['throttled'] += 1
+        # Multiplicative decrease
+        self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2.0)
+
+
+# Process-wide limiter shared by every grading worker thread
+gemini_limiter = GeminiLimiter()
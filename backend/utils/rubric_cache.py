@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.http_client import http_client
+from utils.storage import storage
+from utils.atomic_file import atomic_write
+
+class CachedRubric:
+    """A downloaded rubric together with the validators needed to revalidate it"""
+
+    def __init__(self, url, content, etag=None, last_modified=None, checked_at=None, immutable=False):
+        self.url = url
+        self.content = content
+        self.sha256 = hashlib.sha256(content).hexdigest()
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = checked_at or time.time()
+        # Content-addressed files in our own storage never change under the same URL
+        self.immutable = immutable
+
+    def is_fresh(self, ttl):
+        return self.immutable or time.time() - self.checked_at < ttl
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class RubricCache:
+    """
+    Two-tier rubric cache: an in-memory LRU bounded by total bytes, backed by an
+    on-disk store with one index file per URL and one blob per content hash.
+
+    Entries younger than ``ttl`` seconds are served without touching the network;
+    older entries are revalidated with If-None-Match / If-Modified-Since.
+    """
+
+    def __init__(self, cache_dir='cache/rubrics', max_memory_bytes=64 * 1024 * 1024, ttl=300):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'revalidated': 0, 'misses': 0}
+
+    def init_app(self, app):
+        """Configure the cache from the Flask app config"""
+        self.cache_dir = app.config['RUBRIC_CACHE_DIR']
+        self.max_memory_bytes = app.config['RUBRIC_CACHE_MEMORY_BYTES']
+        self.ttl = app.config['RUBRIC_CACHE_TTL']
+
+    def get(self, url):
+        """
+        Get the rubric at ``url``, downloading it only when needed
+
+        Args:
+            url (str): URL of the rubric PDF
+
+        Returns:
+            bytes: The rubric content
+
+        Raises:
+            DownloadStatusError: If the rubric could not be downloaded
+            FileNotFoundError: If a rubric in the app's own storage is missing
+        """
+        return http_client.run_sync(self.aget(url))
+
+    async def aget(self, url):
+        """Async variant of ``get`` for use on the shared HTTP client's event loop"""
+        entry = self._memory_get(url)
+        if entry is not None and entry.is_fresh(self.ttl):
+            self._count('memory_hits')
+            return entry.content
+
+        key = storage.key_from_url(url)
+        if key is not None:
+            # Stored by this app: read it from the storage backend, no disk tier needed
+            content = await storage.aread(key)
+            entry = CachedRubric(url, content, immutable=True)
+            self._count('misses')
+            self._memory_put(entry)
+            return entry.content
+
+        if entry is None:
+            entry = self._disk_get(url)
+            if entry is not None and entry.is_fresh(self.ttl):
+                self._memory_put(entry)
+                self._count('disk_hits')
+                return entry.content
+
+        headers = entry.conditional_headers() if entry is not None else {}
+        response = await http_client.fetch(url, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            entry.checked_at = time.time()
+            self._count('revalidated')
+        else:
+            response.raise_for_status()
+            entry = CachedRubric(
+                url,
+                response.content,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+            self._count('misses')
+            print(f"Rubric cache miss, downloaded {len(entry.content)} bytes from {url}")
+
+        self._disk_put(entry)
+        self._memory_put(entry)
+        return entry.content
+
+    def stats(self):
+        """
+        Get the cache counters
+
+        Returns:
+            dict: Hit/miss counters and current memory usage
+        """
+        with self._lock:
+            return {
+                **self._counters,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes
+            }
+
+    def clear(self):
+        """Drop every in-memory entry (the disk store is left untouched)"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _memory_get(self, url):
+        with self._lock:
+            entry = self._memory.get(url)
+            if entry is not None:
+                self._memory.move_to_end(url)
+            return entry
+
+    def _memory_put(self, entry):
+        size = len(entry.content)
+        if size > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            previous = self._memory.pop(entry.url, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous.content)
+
+            self._memory[entry.url] = entry
+            self._memory_bytes += size
+
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted.content)
+
+    def _index_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, 'index', f"{key}.json")
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.cache_dir, 'blobs', f"{sha256}.pdf")
+
+    def _disk_get(self, url):
+        try:
+            with open(self._index_path(url)) as f:
+                meta = json.load(f)
+            with open(self._blob_path(meta['sha256']), 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+
+        entry = CachedRubric(
+            url,
+            content,
+            etag=meta.get('etag'),
+            last_modified=meta.get('last_modified'),
+            checked_at=meta.get('checked_at')
+        )
+        if entry.sha256 != meta['sha256']:
+            # Corrupt blob, treat as a miss
+            return None
+        return entry
+
+    def _disk_put(self, entry):
+        try:
+            blob_path = self._blob_path(entry.sha256)
+            if not os.path.exists(blob_path):
+                atomic_write(blob_path, entry.content)
+
+            meta = {
+                'url': entry.url,
+                'sha256': entry.sha256,
+                'etag': entry.etag,
+                'last_modified': entry.last_modified,
+                'checked_at': entry.checked_at
+            }
+            atomic_write(self._index_path(entry.url), json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            # The disk tier is best effort; the memory tier still works
+            print(f"Rubric cache write error: {e}")
+
+
+# Process-wide cache shared by every grading worker thread
+rubric_cache = RubricCache()
@@ -0,0 +1,127 @@
+import io
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from utils.http_client import http_client
+
+class RubricHandle:
+    """Reference to a rubric that has already been uploaded to the model provider"""
+
+    def __init__(self, uri, expires_at=None, mime_type='application/pdf'):
+        self.uri = uri
+        self.expires_at = expires_at
+        self.mime_type = mime_type
+
+    def is_valid(self, margin=timedelta(minutes=10)):
+        """
+        Check whether the handle can still be used
+
+        Args:
+            margin (timedelta): Safety margin so a handle does not expire mid-request
+
+        Returns:
+            bool: True if the handle has a URI and is not (about to be) expired
+        """
+        if not self.uri:
+            return False
+        if self.expires_at is None:
+            return True
+        return datetime.utcnow() + margin < self.expires_at
+
+    def to_part(self):
+        """Build a content part referring to the uploaded rubric"""
+        return {"file_data": {"mime_type": self.mime_type, "file_uri": self.uri}}
+
+
+class RubricHandleClient:
+    """
+    Small interface over the Gemini Files API used to upload rubrics once per exam.
+
+    Any object exposing ``files.upload(file=..., config=...)`` that returns an object
+    with ``uri`` and ``expiration_time`` works as the underlying client, so a local
+    fake can stand in for Gemini.
+
+    Uploads go through the Gemini limiter when one is given. A rubric whose upload
+    failed is not uploaded again for ``failure_backoff`` seconds (per process), so
+    every grading job in the meantime goes straight to the inline rubric.
+    """
+
+    def __init__(self, client, limiter=None, failure_backoff=600):
+        self.client = client
+        self.limiter = limiter
+        self.failure_backoff = failure_backoff
+        self._failed_at = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the failure backoff from the Flask app config"""
+        self.failure_backoff = app.config['RUBRIC_UPLOAD_BACKOFF']
+
+    def upload(self, content, display_name=None):
+        """
+        Upload rubric bytes and return a handle to them
+
+        Args:
+            content (bytes): The rubric PDF
+            display_name (str, optional): Name shown in the provider console
+
+        Returns:
+            RubricHandle: Handle to the uploaded rubric
+        """
+        config = {'mime_type': 'application/pdf'}
+        if display_name:
+            config['display_name'] = display_name
+
+        def make_upload():
+            return self.client.files.upload(file=io.BytesIO(content), config=config)
+
+        if self.limiter is None:
+            uploaded = make_upload()
+        else:
+            # Shares the request budget and concurrency limit with grading calls
+            uploaded = http_client.run_sync(
+                self.limiter.call(lambda: asyncio.to_thread(make_upload), estimated_tokens=0)
+            )
+        return RubricHandle(uploaded.uri, _to_naive_utc(uploaded.expiration_time))
+
+    def try_upload(self, content, display_name=None, key=None):
+        """
+        Upload rubric bytes, returning None instead of raising on failure
+
+        Args:
+            content (bytes): The rubric PDF
+            display_name (str, optional): Name shown in the provider console
+            key (str, optional): Identity of the rubric (e.g. its URL); failures
+                are remembered under it and not retried during the backoff
+
+        Returns:
+            RubricHandle: Handle to the uploaded rubric, or None
+        """
+        if key is not None:
+            with self._lock:
+                failed_at = self._failed_at.get(key)
+            if failed_at is not None and time.monotonic() - failed_at < self.failure_backoff:
+                return None
+
+        try:
+            handle = self.upload(content, display_name)
+        except Exception as e:
+            if key is not None:
+                with self._lock:
+                    self._failed_at[key] = time.monotonic()
+            print(f"Rubric upload to Gemini failed, grading will send it inline "
+                  f"for the next {self.failure_backoff}s: {e}")
+            return None
+
+        if key is not None:
+            with self._lock:
+                self._failed_at.pop(key, None)
+        print(f"Rubric uploaded to Gemini: {handle.uri} (expires {handle.expires_at})")
+        return handle
+
+
+def _to_naive_utc(value):
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,417 @@
+import os
+import asyncio
+from contextlib import closing
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from flask import request
+from cloudinary import uploader
+from utils.blob_store import LocalBlobStore
+from utils.http_client import DownloadTooLargeError
+
+class StoredFile:
+    """Result of saving an upload: where the file went and what it contains"""
+
+    def __init__(self, url, sha256, size, key=None, deduplicated=False):
+        self.url = url
+        self.sha256 = sha256
+        self.size = size
+        self.key = key
+        self.deduplicated = deduplicated
+
+
+class StorageBackend:
+    """
+    Interface of the storage drivers.
+
+    Files are saved from fully written temporary files (see ``spool_upload``) and
+    addressed by content (``ab/cd/<sha256>.pdf``). Drivers that keep files private
+    to the app serve them at ``/uploads/<BLOB_STORE_FOLDER>/<key>``, and grading
+    reads them back through ``open`` instead of downloading the public URL.
+    """
+
+    name = None
+    # Directory holding the stored files when they live on local disk, else None
+    local_root = None
+
+    def save(self, tmp_path, sha256, ext, folder):
+        """
+        Store a spooled upload
+
+        Args:
+            tmp_path (str): Temporary file holding the upload; it may be moved into
+                the store, the caller removes it if it is still there afterwards
+            sha256 (str): Hex digest of its content
+            ext (str): File extension including the dot
+            folder (str): Logical folder, used by drivers with folder-based naming
+
+        Returns:
+            StoredFile: The stored file
+        """
+        raise NotImplementedError
+
+    def open(self, key, start=None, stop=None):
+        """
+        Open a stored file for streaming reads
+
+        Args:
+            key (str): Storage key
+            start (int, optional): First byte to read
+            stop (int, optional): Byte to stop before; reading ends there
+
+        Raises:
+            FileNotFoundError: If there is no file under ``key``
+        """
+        raise NotImplementedError
+
+    def size(self, key):
+        """
+        Get the size of a stored file in bytes
+
+        Raises:
+            FileNotFoundError: If there is no file under ``key``
+        """
+        raise NotImplementedError
+
+    def iter_blobs(self):
+        """Yield (key, size, age in seconds) for every content-addressed file"""
+        return iter(())
+
+    def delete(self, key):
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """Content-addressed files on local disk, served by the app"""
+
+    name = 'local'
+
+    def __init__(self, root, url_folder):
+        self.store = LocalBlobStore(root)
+        self.local_root = root
+        self.url_folder = url_folder
+
+    def save(self, tmp_path, sha256, ext, folder):
+        size = os.path.getsize(tmp_path)
+        key, created = self.store.put(tmp_path, sha256, ext)
+        if created:
+            print(f"File saved locally: {key}")
+        else:
+            print(f"File already stored locally, reusing: {key}")
+        return StoredFile(_app_url(self.url_folder, key), sha256, size, key=key, deduplicated=not created)
+
+    def open(self, key, start=None, stop=None):
+        f = open(self.store.path_for(key), 'rb')
+        if start:
+            f.seek(start)
+        if stop is None:
+            return f
+        return _LimitedReader(f, stop - (start or 0))
+
+    def size(self, key):
+        return os.path.getsize(self.store.path_for(key))
+
+    def iter_blobs(self):
+        return self.store.iter_blobs()
+
+    def delete(self, key):
+        self.store.delete(key)
+
+
+class CloudinaryStorage(StorageBackend):
+    """Cloudinary uploads with public URLs, falling back to another driver when they fail"""
+
+    name = 'cloudinary'
+
+    def __init__(self, chunk_size, fallback):
+        self.chunk_size = chunk_size
+        self.fallback = fallback
+        self.local_root = fallback.local_root
+
+    def save(self, tmp_path, sha256, ext, folder):
+        try:
+            upload_folder = f"{folder}/{sha256[:32]}"
+            print(f"Attempting Cloudinary upload to folder: {upload_folder}")
+
+            # Sent in chunk_size parts, read from disk one part at a time
+            response = uploader.upload_large(
+                tmp_path,
+                resource_type="auto",
+                folder=upload_folder,
+                use_filename=True,
+                unique_filename=True,
+                chunk_size=self.chunk_size
+            )
+            print(f"File successfully uploaded to Cloudinary: {response['secure_url']}")
+            return StoredFile(response['secure_url'], sha256, os.path.getsize(tmp_path))
+        except Exception as e:
+            print(f"Cloudinary upload error, falling back to {self.fallback.name} storage: {e}")
+            return self.fallback.save(tmp_path, sha256, ext, folder)
+
+    # Cloudinary files are read through their public URLs; only fallback files are ours
+    def open(self, key, start=None, stop=None):
+        return self.fallback.open(key, start, stop)
+
+    def size(self, key):
+        return self.fallback.size(key)
+
+    def iter_blobs(self):
+        return self.fallback.iter_blobs()
+
+    def delete(self, key):
+        self.fallback.delete(key)
+
+
+class S3Storage(StorageBackend):
+    """
+    Content-addressed files in an S3-compatible bucket (AWS S3, MinIO, R2, ...).
+
+    Objects stay private and are served by the app. Large files are uploaded as
+    parallel multipart uploads and read back as streams.
+    """
+
+    name = 's3'
+
+    def __init__(self, bucket, prefix, url_folder, endpoint_url=None, region=None, access_key_id=None,
+                 secret_access_key=None, multipart_threshold=8 * 1024 * 1024,
+                 multipart_chunk_size=8 * 1024 * 1024, max_concurrency=8):
+        # Optional dependency, only needed with STORAGE_BACKEND=s3
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.exceptions import ClientError
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_folder = url_folder
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunk_size,
+            max_concurrency=max_concurrency,
+            use_threads=True
+        )
+        self._client_error = ClientError
+
+    def save(self, tmp_path, sha256, ext, folder):
+        size = os.path.getsize(tmp_path)
+        key = LocalBlobStore.key_for(sha256, ext)
+        object_key = self.prefix + key
+
+        deduplicated = self._exists(object_key)
+        if deduplicated:
+            print(f"File already stored in bucket {self.bucket}, reusing: {key}")
+        else:
+            self.client.upload_file(
+                tmp_path,
+                self.bucket,
+                object_key,
+                ExtraArgs={'ContentType': 'application/pdf' if ext.lower() == '.pdf' else 'application/octet-stream'},
+                Config=self.transfer_config
+            )
+            print(f"File uploaded to bucket {self.bucket}: {key}")
+        return StoredFile(_app_url(self.url_folder, key), sha256, size, key=key, deduplicated=deduplicated)
+
+    def open(self, key, start=None, stop=None):
+        params = {'Bucket': self.bucket, 'Key': self.prefix + key}
+        if start is not None or stop is not None:
+            params['Range'] = f"bytes={start or 0}-{'' if stop is None else stop - 1}"
+        try:
+            return self.client.get_object(**params)['Body']
+        except self._client_error as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def size(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)['ContentLength']
+        except self._client_error as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404', 'NotFound'):
+                raise FileNotFoundError(key) from e
+            raise
+
+    def iter_blobs(self):
+        now = datetime.now(timezone.utc)
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(self.prefix):]
+                if LocalBlobStore.sha256_of(key):
+                    yield key, item['Size'], (now - item['LastModified']).total_seconds()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def _exists(self, object_key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=object_key)
+            return True
+        except self._client_error as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+
+class Storage:
+    """
+    Process-wide handle on the storage driver selected by STORAGE_BACKEND.
+
+    The driver is built once in ``init_app``; upload, serving and grading code all
+    go through this object.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.url_folder = 'blobs'
+        self.read_chunk_size = 1024 * 1024
+
+    def init_app(self, app):
+        """Build the configured driver from the Flask app config"""
+        config = app.config
+        self.url_folder = config['BLOB_STORE_FOLDER']
+        self.read_chunk_size = config['UPLOAD_CHUNK_SIZE']
+        local = LocalStorage(os.path.join(config['UPLOAD_FOLDER'], self.url_folder), self.url_folder)
+
+        name = config['STORAGE_BACKEND']
+        if name == 'local':
+            self.backend = local
+        elif name == 'cloudinary':
+            self.backend = CloudinaryStorage(config['CLOUDINARY_CHUNK_SIZE'], fallback=local)
+        elif name == 's3':
+            self.backend = S3Storage(
+                config['S3_BUCKET'],
+                config['S3_PREFIX'],
+                self.url_folder,
+                endpoint_url=config['S3_ENDPOINT_URL'],
+                region=config['S3_REGION'],
+                access_key_id=config['S3_ACCESS_KEY_ID'],
+                secret_access_key=config['S3_SECRET_ACCESS_KEY'],
+                multipart_threshold=config['S3_MULTIPART_THRESHOLD'],
+                multipart_chunk_size=config['S3_MULTIPART_CHUNK_SIZE'],
+                max_concurrency=config['S3_MAX_CONCURRENCY']
+            )
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+        print(f"Using {self.backend.name} storage")
+
+    @property
+    def local_root(self):
+        return self.backend.local_root
+
+    def incoming_dir(self, upload_folder):
+        """Directory uploads are spooled to before being saved"""
+        if self.local_root:
+            # Same filesystem as the store, so saving is a rename
+            return os.path.join(self.local_root, '.incoming')
+        return os.path.join(upload_folder, '.incoming')
+
+    def save(self, tmp_path, sha256, ext, folder):
+        return self.backend.save(tmp_path, sha256, ext, folder)
+
+    def open(self, key, start=None, stop=None):
+        return self.backend.open(key, start, stop)
+
+    def size(self, key):
+        return self.backend.size(key)
+
+    def iter_blobs(self):
+        return self.backend.iter_blobs()
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def read(self, key, max_bytes=None):
+        """
+        Read a stored file in chunks
+
+        Args:
+            key (str): Storage key
+            max_bytes (int, optional): Size limit
+
+        Returns:
+            bytes: The file content
+
+        Raises:
+            FileNotFoundError: If there is no file under ``key``
+            DownloadTooLargeError: If the file is larger than ``max_bytes``
+        """
+        chunks = []
+        received = 0
+        with closing(self.open(key)) as body:
+            while True:
+                chunk = body.read(self.read_chunk_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if max_bytes is not None and received > max_bytes:
+                    raise DownloadTooLargeError(f"{key} exceeds the {max_bytes} byte limit")
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def aread(self, key, max_bytes=None):
+        """Async variant of ``read``; the blocking read runs in a worker thread"""
+        return await asyncio.to_thread(self.read, key, max_bytes)
+
+    def key_from_path(self, path):
+        """
+        Get the storage key of a path under /uploads
+
+        Args:
+            path (str): Path relative to /uploads, e.g. 'blobs/ab/cd/<sha256>.pdf'
+
+        Returns:
+            str: The key, or None if the path is not a stored blob
+        """
+        prefix = f"{self.url_folder}/"
+        if not path.startswith(prefix):
+            return None
+        key = path[len(prefix):]
+        return key if LocalBlobStore.sha256_of(key) else None
+
+    def key_from_url(self, url):
+        """
+        Get the storage key of a file URL saved by this app
+
+        Returns:
+            str: The key, or None for URLs this storage does not own (e.g. Cloudinary)
+        """
+        if self.backend is None or not url:
+            return None
+        path = urlparse(url).path
+        marker = '/uploads/'
+        if marker not in path:
+            return None
+        return self.key_from_path(path.split(marker, 1)[1])
+
+
+class _LimitedReader:
+    """File wrapper that stops reading after ``remaining`` bytes"""
+
+    def __init__(self, f, remaining):
+        self.f = f
+        self.remaining = remaining
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def _app_url(url_folder, key):
+    return f"{request.host_url.rstrip('/')}/uploads/{url_folder}/{key}"
+
+
+# Process-wide storage, configured in init_extensions
+storage = Storage()
@@ -46,6 +46,7 @@ with app.app_context():
         submission = Submission(
             student_id=student.id,
             exam_id=exam.id,
+            teacher_id=exam.teacher_id,
             answer_sheet_file='https://res.cloudinary.com/demo/image/upload/sample.pdf',
             grade='<h3>SECTION A (10 marks)</h3><p><strong>Q1 (5)</strong>: Good answer - 4/5</p>',
             is_published=False,
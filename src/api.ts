@@ -180,10 +180,12 @@ export const examAPI = {
     }
   },
   
-  getSubmissions: async () => {
+  // Listings leave out the grade body unless it is named in `fields`
+  getSubmissions: async (fields?: string[]) => {
     console.log("API: Fetching submissions");
     try {
-      const response = await fetch(`${API_BASE_URL}/api/submissions`, {
+      const query = fields ? `?fields=${encodeURIComponent(fields.join(','))}` : '';
+      const response = await fetch(`${API_BASE_URL}/api/submissions${query}`, {
         ...commonFetchOptions
       });
       
@@ -214,10 +216,11 @@ export const examAPI = {
     }
   },
   
-  getTeacherSubmissions: async () => {
+  getTeacherSubmissions: async (fields?: string[]) => {
     console.log("API_SERVICE: getTeacherSubmissions called. Cookies:", document.cookie);
     try {
-      const response = await fetch(`${API_BASE_URL}/api/teacher/submissions`, {
+      const query = fields ? `?fields=${encodeURIComponent(fields.join(','))}` : '';
+      const response = await fetch(`${API_BASE_URL}/api/teacher/submissions${query}`, {
         ...commonFetchOptions
       });
       console.log("API_SERVICE: getTeacherSubmissions response status:", response.status);
@@ -240,6 +243,22 @@ export const examAPI = {
     }
   },
   
+  getSubmissionGrade: async (submissionId: number) => {
+    try {
+      const response = await fetch(`${API_BASE_URL}/api/submissions/${submissionId}/grade`, {
+        ...commonFetchOptions
+      });
+      const data = await response.json();
+      if (!response.ok) {
+        return { success: false, message: data.message || `Failed to fetch grade: ${response.status}` };
+      }
+      return data;
+    } catch (error) {
+      console.error("API: Grade fetch exception:", error);
+      return { success: false, message: error instanceof Error ? error.message : 'Unknown error' };
+    }
+  },
+  
   publishGrade: async (submissionId: number) => {
     console.log("API: Publishing grade for submission:", submissionId);
     try {
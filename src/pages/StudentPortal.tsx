@@ -27,7 +27,8 @@ const StudentPortal: React.FC = () => {
       setLoading(true);
       console.log("Fetching submissions...");
       
-      const data = await examAPI.getSubmissions();
+      // Published grades are shown inline, so ask for the grade body as well
+      const data = await examAPI.getSubmissions(['id', 'exam_title', 'exam_code', 'submitted_at', 'is_published', 'grade']);
       console.log("Submissions response:", data);
       
       if (data.success && data.submissions) {
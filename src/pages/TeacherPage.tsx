@@ -34,6 +34,18 @@ const TeacherPage: React.FC = () => {
   const [loadingExams, setLoadingExams] = useState<boolean>(false);
   const [loadingSubmissions, setLoadingSubmissions] = useState<boolean>(false);
 
+  // Load a grade body the first time its section is opened; the listing leaves it out
+  const loadGrade = async (submissionId: number) => {
+    const submission = submissions.find(sub => sub.id === submissionId);
+    if (!submission || submission.grade !== undefined) return;
+    const data = await examAPI.getSubmissionGrade(submissionId);
+    if (data.success) {
+      setSubmissions(current => current.map(sub =>
+        sub.id === submissionId ? { ...sub, grade: data.grade ?? '' } : sub
+      ));
+    }
+  };
+
   // Toggle grades section
   const toggleGrade = (element: HTMLElement) => {
     const gradeText = element.nextElementSibling as HTMLElement;
@@ -763,7 +775,7 @@ const TeacherPage: React.FC = () => {
                         overflow: 'hidden' // Ensures content stays within rounded corners
                       }}>
                         <div 
-                          onClick={(e) => toggleGrade(e.currentTarget)}
+                          onClick={(e) => { toggleGrade(e.currentTarget); loadGrade(submission.id); }}
                           style={{
                             display: 'flex',
                             justifyContent: 'space-between',
@@ -793,7 +805,7 @@ const TeacherPage: React.FC = () => {
                           }}
                         >
                           {/* Revert TEMP DEBUG: Render HTML content safely */}
-                          <div dangerouslySetInnerHTML={{ __html: submission.grade || 'No grade available.' }} />
+                          <div dangerouslySetInnerHTML={{ __html: submission.grade === undefined ? 'Loading...' : (submission.grade || 'No grade available.') }} />
                         </div>
                       </div>
 
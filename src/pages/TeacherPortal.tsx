@@ -67,7 +67,9 @@ const TeacherPortal: React.FC = () => {
       setDebugInfo('');
       console.log("TeacherPortal: Starting to fetch teacher submissions");
       
-      const data = await examAPI.getTeacherSubmissions();
+      const data = await examAPI.getTeacherSubmissions([
+        'id', 'student_name', 'exam_title', 'exam_code', 'submitted_at', 'is_published', 'answer_sheet_url', 'grade'
+      ]);
       console.log("TeacherPortal: Received teacher submissions response:", data);
       
       if (data.success && data.submissions) {